@@ -1,15 +1,27 @@
 import os
-import csv
+import sys
+import json
+import time
 import random
+import asyncio
 import argparse
 from pathlib import Path
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from typing import Literal
+from typing import Iterable, Iterator, Literal, NamedTuple
 from dotenv import load_dotenv
 
+# The dataset readers are shared with the task generator; the repository
+# root is not on the path when this runs as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tasks.dataset import iter_rows, reservoir_sample
+from cache import CACHE_MODES, CacheMode, ResponseCache, cache_key
+from metrics import compute_metrics, format_metrics
+from rules import LocalRouter, NearestNeighbourClassifier
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -17,6 +29,19 @@ load_dotenv()
 SEED = 0
 MAX_SAMPLES = 10
 
+# Batch classification parameters
+CONCURRENCY = 8
+REQUESTS_PER_SECOND = 5.0
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0
+MAX_CONNECTIONS = CONCURRENCY
+
+# Response cache mode for the shared classifiers: use, refresh or bypass
+CACHE_MODE: CacheMode = "use"
+
+# Where the demo writes its machine-readable metrics
+METRICS_PATH = "metrics.json"
+
 # Few-shot examples for classification
 EXAMPLES = """
 Easy: Does Jessica von Bredow-Werndl have more Bronze Medals than Gold Medals?
@@ -47,72 +72,460 @@ Respond with ONLY one word: easy, medium, or hard""",
 )
 
 
-def get_llm(provider: Literal["openai", "anthropic"] = "openai"):
-    """Get LLM instance based on provider."""
+# Default chat model of each provider
+DEFAULT_MODELS = {
+    "openai": "gpt-3.5-turbo",
+    "anthropic": "claude-sonnet-4-5-20250929",
+}
+
+
+def get_llm(provider: Literal["openai", "anthropic"] = "openai", model: str | None = None, **kwargs):
+    """Get LLM instance based on provider. Extra arguments go to the model class."""
+    model = model or DEFAULT_MODELS[provider]
     if provider == "anthropic":
-        return ChatAnthropic(model="claude-sonnet-4-5-20250929", temperature=0)
+        return ChatAnthropic(model=model, temperature=0, **kwargs)
     else:
-        return ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+        return ChatOpenAI(model=model, temperature=0, **kwargs)
+
+
+class TokenBucket:
+    """Async token-bucket rate limiter: ``rate`` acquisitions per second, bursts up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Classification(NamedTuple):
+    """A classifier answer with the wall time and token usage of its call.
+
+    Cached answers have no token usage.
+    """
+
+    label: str
+    latency: float
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached: bool = False
+
+
+class DifficultyClassifier:
+    """Difficulty classifier that keeps one chat client and one chain alive.
+
+    For OpenAI the client gets its own keep-alive HTTP pools sized to
+    ``max_connections``. ChatAnthropic takes no HTTP client, so Anthropic
+    calls share the process-wide pools langchain_anthropic caches per base
+    URL (1000 connections, 100 kept alive), already larger than CONCURRENCY.
+    The blocking batch API runs on a private event loop, so the async pool
+    survives between calls. ``model`` overrides the provider's default
+    model. With a ``cache``, responses are looked up by
+    provider, model, rendered prompt and question before calling the model.
+    Call ``close()`` (or use ``with``) when done, or ``await aclose()`` when
+    the classifier was only used from another event loop.
+    """
+
+    def __init__(
+        self,
+        provider: Literal["openai", "anthropic"] = "openai",
+        llm=None,
+        max_connections: int = MAX_CONNECTIONS,
+        cache: ResponseCache | None = None,
+        model: str | None = None,
+    ):
+        self.provider = provider
+        self.cache = cache
+        self.http_client = None
+        self.http_async_client = None
+        if llm is None:
+            kwargs = {}
+            # max_connections only sizes the OpenAI pools, see above
+            if provider == "openai":
+                limits = httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                )
+                self.http_client = httpx.Client(limits=limits)
+                self.http_async_client = httpx.AsyncClient(limits=limits)
+                kwargs = {
+                    "http_client": self.http_client,
+                    "http_async_client": self.http_async_client,
+                }
+            llm = get_llm(provider, model=model, **kwargs)
+        self.llm = llm
+        self.model_name = chat_model_name(llm)
+        self.chain = prompt | llm
+        self.parser = StrOutputParser()
+        self.runner = asyncio.Runner()
+        self.closed = False
+
+    def _cache_key(self, question: str) -> str:
+        rendered = prompt.format(examples=EXAMPLES, question=question)
+        return cache_key(self.provider, self.model_name, rendered, question)
+
+    def _classification(self, message, key: str | None, start: float) -> Classification:
+        """Parse a model response, cache its label and attach its usage metadata."""
+        label = self.parser.invoke(message).strip().lower()
+        latency = time.perf_counter() - start
+        if key:
+            self.cache.put(key, label)
+        usage = getattr(message, "usage_metadata", None) or {}
+        return Classification(
+            label, latency, usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        )
+
+    def classify_detailed(self, question: str) -> Classification:
+        """Classify a question, returning the label with its call metrics."""
+        start = time.perf_counter()
+        key = self._cache_key(question) if self.cache else None
+        if key and (cached := self.cache.get(key)) is not None:
+            return Classification(cached, time.perf_counter() - start, cached=True)
+        message = self.chain.invoke({"examples": EXAMPLES, "question": question})
+        return self._classification(message, key, start)
+
+    async def aclassify_detailed(self, question: str) -> Classification:
+        """Async version of classify_detailed."""
+        start = time.perf_counter()
+        key = self._cache_key(question) if self.cache else None
+        if key and (cached := self.cache.get(key)) is not None:
+            return Classification(cached, time.perf_counter() - start, cached=True)
+        message = await self.chain.ainvoke({"examples": EXAMPLES, "question": question})
+        return self._classification(message, key, start)
+
+    def classify(self, question: str) -> str:
+        """Classify a question as easy, medium, or hard."""
+        return self.classify_detailed(question).label
+
+    async def aclassify(self, question: str) -> str:
+        """Async version of classify."""
+        return (await self.aclassify_detailed(question)).label
+
+    async def aclassify_many(
+        self,
+        questions: list[str],
+        concurrency: int = CONCURRENCY,
+        rps: float | None = REQUESTS_PER_SECOND,
+        retries: int = MAX_RETRIES,
+        return_exceptions: bool = False,
+        semaphore: asyncio.Semaphore | None = None,
+        bucket: TokenBucket | None = None,
+        detailed: bool = False,
+    ) -> list:
+        """Classify many questions concurrently, returning results in input order.
+
+        At most ``concurrency`` requests are in flight and, if ``rps`` is set,
+        no more than ``rps`` are started per second. Failed calls are retried
+        up to ``retries`` times with jittered exponential backoff. With
+        ``return_exceptions`` the final error of a question is returned in
+        its slot instead of being raised. A ``semaphore`` or ``bucket`` passed
+        in replaces the ones built from ``concurrency`` and ``rps``, so several
+        batches can share one limit. With ``detailed`` each answer is a
+        Classification of the successful attempt.
+        """
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(concurrency)
+        if bucket is None and rps:
+            bucket = TokenBucket(rps)
+        jitter = random.Random()
+
+        async def classify(question: str) -> str | Classification:
+            async with semaphore:
+                for attempt in range(retries + 1):
+                    if bucket:
+                        await bucket.acquire()
+                    try:
+                        result = await self.aclassify_detailed(question)
+                        return result if detailed else result.label
+                    except Exception:
+                        if attempt == retries:
+                            raise
+                        await asyncio.sleep(RETRY_BASE_DELAY * 2**attempt * jitter.uniform(0.5, 1.5))
+
+        return await asyncio.gather(
+            *(classify(q) for q in questions), return_exceptions=return_exceptions
+        )
+
+    def classify_many(self, questions: list[str], **kwargs) -> list:
+        """Blocking version of aclassify_many, run on the classifier's own event loop."""
+        return self.runner.run(self.aclassify_many(questions, **kwargs))
+
+    def close(self) -> None:
+        """Close the HTTP pools, the private event loop and the cache."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.cache is not None:
+            self.cache.close()
+        if self.http_async_client is not None:
+            self.runner.run(self.http_async_client.aclose())
+        if self.http_client is not None:
+            self.http_client.close()
+        self.runner.close()
+
+    async def aclose(self) -> None:
+        """Close the classifier from inside the event loop that used its async pool."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.cache is not None:
+            self.cache.close()
+        if self.http_async_client is not None:
+            await self.http_async_client.aclose()
+        if self.http_client is not None:
+            self.http_client.close()
+        self.runner.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def chat_model_name(llm) -> str:
+    """Model name of a chat model, falling back to its class name."""
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+
+# Shared classifiers, one per provider
+_classifiers: dict[str, DifficultyClassifier] = {}
+
+
+def get_classifier(provider: Literal["openai", "anthropic"] = "openai") -> DifficultyClassifier:
+    """Return the shared classifier for ``provider``, creating it on first use.
+
+    Shared classifiers use the on-disk response cache in CACHE_MODE.
+    """
+    classifier = _classifiers.get(provider)
+    if classifier is None or classifier.closed:
+        classifier = DifficultyClassifier(provider, cache=ResponseCache(mode=CACHE_MODE))
+        _classifiers[provider] = classifier
+    return classifier
+
+
+def cache_stats(provider: Literal["openai", "anthropic"] = "openai") -> tuple[int, int]:
+    """(hits, misses) of the shared classifier's response cache so far.
+
+    Only reads the classifier if one was created; (0, 0) otherwise.
+    """
+    classifier = _classifiers.get(provider)
+    if classifier is None or classifier.cache is None:
+        return 0, 0
+    return classifier.cache.stats()
+
+
+def close_classifiers() -> None:
+    """Close every shared classifier."""
+    while _classifiers:
+        _, classifier = _classifiers.popitem()
+        classifier.close()
 
 
 def classify_question(
     question: str, provider: Literal["openai", "anthropic"] = "openai"
 ) -> str:
     """Classify a question as easy, medium, or hard."""
-    llm = get_llm(provider)
-    chain = prompt | llm | StrOutputParser()
-    result = chain.invoke({"examples": EXAMPLES, "question": question})
-    return result.strip().lower()
+    return get_classifier(provider).classify(question)
 
 
-def load_test_data(dataset_path: str, difficulty: str) -> list[tuple[str, str]]:
-    """Load questions and expected difficulties from TSV file."""
-    questions = []
+async def aclassify_questions(
+    questions: list[str],
+    provider: Literal["openai", "anthropic"] = "openai",
+    concurrency: int = CONCURRENCY,
+    rps: float | None = REQUESTS_PER_SECOND,
+    llm=None,
+    **kwargs,
+) -> list:
+    """Classify many questions concurrently (see DifficultyClassifier.aclassify_many).
+
+    ``llm`` overrides the provider's chat model. The shared classifier's async
+    HTTP pool is bound to the first event loop that uses it, so a process
+    should stick to either this or the blocking classify_questions.
+    """
+    if llm is not None:
+        classifier = DifficultyClassifier(provider, llm=llm)
+        try:
+            return await classifier.aclassify_many(
+                questions, concurrency=concurrency, rps=rps, **kwargs
+            )
+        finally:
+            classifier.runner.close()
+    return await get_classifier(provider).aclassify_many(
+        questions, concurrency=concurrency, rps=rps, **kwargs
+    )
+
+
+def classify_questions(
+    questions: list[str],
+    provider: Literal["openai", "anthropic"] = "openai",
+    concurrency: int = CONCURRENCY,
+    rps: float | None = REQUESTS_PER_SECOND,
+    llm=None,
+    **kwargs,
+) -> list:
+    """Blocking version of aclassify_questions."""
+    if llm is not None:
+        with DifficultyClassifier(provider, llm=llm) as classifier:
+            return classifier.classify_many(
+                questions, concurrency=concurrency, rps=rps, **kwargs
+            )
+    return get_classifier(provider).classify_many(
+        questions, concurrency=concurrency, rps=rps, **kwargs
+    )
+
+
+def iter_test_data(dataset_path: str, difficulty: str) -> Iterator[tuple[str, str]]:
+    """Stream questions and expected difficulties from a TSV file.
+
+    Only the Questions and Difficulty columns are kept.
+    """
     file_path = Path(dataset_path) / f"{difficulty}.tsv"
     
     if not file_path.exists():
         print(f"Warning: {file_path} not found")
-        return questions
+        return
     
-    with open(file_path, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f, delimiter="	")
-        for row in reader:
-            question = row.get("Questions", "")
-            expected_difficulty = row.get("Difficulty", "").lower()
+    try:
+        for row in iter_rows(file_path, columns=("Questions", "Difficulty")):
+            question = row["Questions"]
+            expected_difficulty = row["Difficulty"].lower()
             if question and expected_difficulty:
-                questions.append((question, expected_difficulty))
-    
-    return questions
+                yield question, expected_difficulty
+    except KeyError as e:
+        print(f"Warning: {e}")
 
 
-def sample_data(questions: list[tuple[str, str]], seed: int = SEED, max_samples: int = MAX_SAMPLES) -> list[tuple[str, str]]:
-    """Sample a subset of questions using the specified seed and max samples."""
-    if max_samples <= 0:
-        return questions
-    
-    # Set the random seed for reproducibility
-    random.seed(seed)
-    
-    # If we have fewer questions than max_samples, return all of them
-    if len(questions) <= max_samples:
-        return questions
-    
-    # Sample max_samples questions randomly
-    return random.sample(questions, max_samples)
+def load_test_data(dataset_path: str, difficulty: str) -> list[tuple[str, str]]:
+    """Load questions and expected difficulties from TSV file."""
+    return list(iter_test_data(dataset_path, difficulty))
+
+
+def sample_data(questions: Iterable[tuple[str, str]], seed: int = SEED, max_samples: int = MAX_SAMPLES) -> list[tuple[str, str]]:
+    """Sample a subset of questions using the specified seed and max samples.
+
+    Uses seeded reservoir sampling, so sampling a list or streaming the same
+    rows with sample_test_data picks the same questions.
+    """
+    sample, _ = reservoir_sample(questions, max_samples, seed)
+    return sample
+
+
+def sample_test_data(
+    dataset_path: str, difficulty: str, seed: int = SEED, max_samples: int = MAX_SAMPLES
+) -> tuple[list[tuple[str, str]], int]:
+    """Sample questions from a TSV file in one pass, returning (sample, questions read)."""
+    return reservoir_sample(iter_test_data(dataset_path, difficulty), max_samples, seed)
 
 
 def evaluate_accuracy(
     test_data: list[tuple[str, str]],
-    provider: Literal["openai", "anthropic"] = "openai"
+    provider: Literal["openai", "anthropic"] = "openai",
+    concurrency: int = CONCURRENCY,
+    rps: float | None = REQUESTS_PER_SECOND,
+    local_router: LocalRouter | None = None,
+    llm=None,
+) -> tuple[float, int, int, list[dict], dict]:
+    """Evaluate classifier accuracy on test data.
+
+    With a ``local_router``, questions it answers confidently skip the LLM,
+    and the provider's classifier is only created if some question is left.
+    ``llm`` overrides the provider's chat model.
+    Each result records the deciding tier, its wall time in seconds, the
+    token usage of the LLM call and the error type of failed questions.
+    The last item returned holds the aggregate metrics (see
+    metrics.compute_metrics).
+    """
+    start = time.perf_counter()
+    predictions, tiers, latencies = route_locally(test_data, local_router)
+
+    # Everything the local tiers could not decide goes to the LLM
+    escalated = [i for i, tier in enumerate(tiers) if tier == "llm"]
+    model = "local"
+    if escalated:
+        llm_predictions = classify_questions(
+            [test_data[i][0] for i in escalated],
+            provider=provider,
+            concurrency=concurrency,
+            rps=rps,
+            llm=llm,
+            return_exceptions=True,
+            detailed=True,
+        )
+        model = chat_model_name(llm) if llm is not None else get_classifier(provider).model_name
+        for i, predicted_difficulty in zip(escalated, llm_predictions):
+            predictions[i] = predicted_difficulty
+
+    accuracy, correct, total, results = score_predictions(test_data, predictions, tiers, latencies)
+    metrics = compute_metrics(results, time.perf_counter() - start, model)
+    return accuracy, correct, total, results, metrics
+
+
+def route_locally(
+    test_data: list[tuple[str, str]], local_router: LocalRouter | None = None
+) -> tuple[list, list[str], list[float]]:
+    """Run the local tiers over test data, returning (predictions, tiers, latencies).
+
+    Questions the local tiers do not decide have tier ``"llm"`` and a None
+    prediction.
+    """
+    total = len(test_data)
+    predictions = [None] * total
+    tiers = ["llm"] * total
+    latencies = [0.0] * total
+    if local_router is not None:
+        for i, (question, _) in enumerate(test_data):
+            start = time.perf_counter()
+            predictions[i], tiers[i] = local_router.classify(question)
+            latencies[i] = time.perf_counter() - start
+    return predictions, tiers, latencies
+
+
+def score_predictions(
+    test_data: list[tuple[str, str]],
+    predictions: list,
+    tiers: list[str],
+    latencies: list[float],
+    verbose: bool = True,
 ) -> tuple[float, int, int, list[dict]]:
-    """Evaluate classifier accuracy on test data."""
+    """Compare predictions with the expected difficulties.
+
+    Predictions are labels, Classifications (whose latency is added to the
+    local one) or exceptions, which count as wrong answers predicted as
+    ``"ERROR"``. Progress is printed unless ``verbose`` is False.
+    """
     correct = 0
     total = len(test_data)
     results = []
-    
-    for question, expected_difficulty in test_data:
+
+    for (question, expected_difficulty), predicted_difficulty, tier, latency in zip(
+        test_data, predictions, tiers, latencies
+    ):
+        usage = {"input_tokens": 0, "output_tokens": 0, "cached": False}
+        if isinstance(predicted_difficulty, Classification):
+            latency += predicted_difficulty.latency
+            usage = {
+                "input_tokens": predicted_difficulty.input_tokens,
+                "output_tokens": predicted_difficulty.output_tokens,
+                "cached": predicted_difficulty.cached,
+            }
+            predicted_difficulty = predicted_difficulty.label
         try:
-            predicted_difficulty = classify_question(question, provider=provider)
+            if isinstance(predicted_difficulty, Exception):
+                raise predicted_difficulty
             is_correct = predicted_difficulty == expected_difficulty
             if is_correct:
                 correct += 1
@@ -121,55 +534,146 @@ def evaluate_accuracy(
                 "question": question[:100] + "..." if len(question) > 100 else question,
                 "expected": expected_difficulty,
                 "predicted": predicted_difficulty,
-                "correct": is_correct
+                "correct": is_correct,
+                "tier": tier,
+                "latency": latency,
+                **usage,
+                "error": None,
             })
             
             # Print progress
-            print(f"  {correct}/{total} correct | Expected: {expected_difficulty}, Predicted: {predicted_difficulty}")
+            if verbose:
+                print(f"  {correct}/{total} correct | Expected: {expected_difficulty}, Predicted: {predicted_difficulty}")
         except Exception as e:
-            print(f"  Error processing question: {e}")
+            if verbose:
+                print(f"  Error processing question: {e}")
             results.append({
                 "question": question[:100] + "..." if len(question) > 100 else question,
                 "expected": expected_difficulty,
                 "predicted": "ERROR",
-                "correct": False
+                "correct": False,
+                "tier": tier,
+                "latency": latency,
+                **usage,
+                "error": type(e).__name__,
             })
     
     accuracy = correct / total if total > 0 else 0.0
     return accuracy, correct, total, results
 
 
+def build_local_router(
+    local: Literal["none", "rules", "knn"],
+    dataset_path: str,
+    difficulties: list[str],
+    seed: int = SEED,
+    max_samples: int = MAX_SAMPLES,
+) -> LocalRouter | None:
+    """Build the local tiers selected by ``local``, or None for ``"none"``.
+
+    The nearest-neighbour tier is trained on the questions that are not
+    sampled for evaluation with ``seed`` and ``max_samples``.
+    """
+    if local == "none":
+        return None
+    knn = None
+    if local == "knn":
+        train_data = []
+        for difficulty in difficulties:
+            data = load_test_data(dataset_path, difficulty)
+            sampled = set(sample_data(data, seed=seed, max_samples=max_samples))
+            train_data.extend(q for q in data if q not in sampled)
+        knn = NearestNeighbourClassifier().fit(train_data)
+        print(f"Trained nearest-neighbour tier on {len(train_data)} held-out questions (seed={seed})")
+    return LocalRouter(knn=knn)
+
+
+def summarize_tiers(results: list[dict]) -> list[str]:
+    """Report lines with the escalation rate and per-tier counts, accuracy and mean latency."""
+    if not results:
+        return []
+    escalated = sum(1 for r in results if r["tier"] == "llm")
+    lines = [f"  Escalation rate: {escalated / len(results):.2%} ({escalated}/{len(results)})"]
+    for tier in ("rules", "knn", "llm"):
+        tier_results = [r for r in results if r["tier"] == tier]
+        if not tier_results:
+            continue
+        tier_correct = sum(1 for r in tier_results if r["correct"])
+        mean_latency = sum(r["latency"] for r in tier_results) / len(tier_results)
+        lines.append(
+            f"  Tier {tier}: {len(tier_results)} answered, {tier_correct} correct, "
+            f"mean latency {mean_latency * 1000:.3f} ms"
+        )
+    return lines
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the question difficulty classifier")
+    parser.add_argument(
+        "--cache",
+        choices=CACHE_MODES,
+        default=CACHE_MODE,
+        help=f"Response cache mode: use cached answers, refresh them, or bypass the cache (default: {CACHE_MODE})",
+    )
+    parser.add_argument(
+        "--local",
+        choices=("none", "rules", "knn"),
+        default="none",
+        help="Local tiers tried before the LLM: none, pattern rules, or rules plus a TF-IDF nearest-neighbour model (default: none)",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=METRICS_PATH,
+        help=f"JSON file for the metrics of every provider and split (default: {METRICS_PATH})",
+    )
+    args = parser.parse_args()
+
+    # Use the cache mode from command line argument
+    CACHE_MODE = args.cache
+
     # Dataset path
     dataset_path = "../external/nsum/Dataset/Test_Dataset_with_Splits"
     
     # Difficulties to test
     difficulties = ["Easy", "Medium", "Hard"]
+
+    local_router = build_local_router(args.local, dataset_path, difficulties)
+    all_metrics = {}
     
-    # Check if OpenAI API key is set
-    if os.getenv("OPENAI_API_KEY"):
+    for provider, label in (("openai", "OpenAI"), ("anthropic", "Anthropic")):
+        env_var = f"{provider.upper()}_API_KEY"
+        if not os.getenv(env_var):
+            print(f"Skipping {label} tests: {env_var} not set")
+            continue
+
         print("=" * 80)
-        print("Testing with OpenAI")
+        print(f"Testing with {label}")
         print("=" * 80)
         
         for difficulty in difficulties:
             print(f"--- {difficulty} Dataset ---")
-            test_data = load_test_data(dataset_path, difficulty)
+            # Stream and sample the data in one pass
+            test_data, loaded = sample_test_data(dataset_path, difficulty, seed=SEED, max_samples=MAX_SAMPLES)
             
             if not test_data:
                 print(f"No test data found for {difficulty}")
                 continue
             
-            print(f"Loaded {len(test_data)} questions from {difficulty}.tsv")
-            
-            # Sample the data
-            test_data = sample_data(test_data, seed=SEED, max_samples=MAX_SAMPLES)
+            print(f"Loaded {loaded} questions from {difficulty}.tsv")
             print(f"Sampled {len(test_data)} questions (seed={SEED}, max_samples={MAX_SAMPLES})")
             
-            accuracy, correct, total, results = evaluate_accuracy(test_data, provider="openai")
+            hits, misses = cache_stats(provider)
+            accuracy, correct, total, results, metrics = evaluate_accuracy(
+                test_data, provider=provider, local_router=local_router
+            )
+            all_metrics.setdefault(provider, {})[difficulty] = metrics
+            new_hits, new_misses = cache_stats(provider)
             
             print(f"{difficulty} Results:")
             print(f"  Accuracy: {accuracy:.2%} ({correct}/{total})")
+            print(f"  Cache: {new_hits - hits} hits, {new_misses - misses} misses")
+            for line in summarize_tiers(results) + format_metrics(metrics):
+                print(line)
             
             # Print incorrect predictions
             incorrect = [r for r in results if not r["correct"]]
@@ -180,42 +684,10 @@ if __name__ == "__main__":
                     print(f"      Question: {r['question']}")
                 if len(incorrect) > 5:
                     print(f"    ... and {len(incorrect) - 5} more")
-    else:
-        print("Skipping OpenAI tests: OPENAI_API_KEY not set")
-    
-    # Check if Anthropic API key is set
-    if os.getenv("ANTHROPIC_API_KEY"):
-        print("" + "=" * 80)
-        print("Testing with Anthropic")
-        print("=" * 80)
-        
-        for difficulty in difficulties:
-            print(f"--- {difficulty} Dataset ---")
-            test_data = load_test_data(dataset_path, difficulty)
-            
-            if not test_data:
-                print(f"No test data found for {difficulty}")
-                continue
-            
-            print(f"Loaded {len(test_data)} questions from {difficulty}.tsv")
-            
-            # Sample the data
-            test_data = sample_data(test_data, seed=SEED, max_samples=MAX_SAMPLES)
-            print(f"Sampled {len(test_data)} questions (seed={SEED}, max_samples={MAX_SAMPLES})")
-            
-            accuracy, correct, total, results = evaluate_accuracy(test_data, provider="anthropic")
-            
-            print(f"{difficulty} Results:")
-            print(f"  Accuracy: {accuracy:.2%} ({correct}/{total})")
-            
-            # Print incorrect predictions
-            incorrect = [r for r in results if not r["correct"]]
-            if incorrect:
-                print(f"  Incorrect predictions ({len(incorrect)}):")
-                for r in incorrect[:5]:  # Show first 5 incorrect
-                    print(f"    - Expected: {r['expected']}, Predicted: {r['predicted']}")
-                    print(f"      Question: {r['question']}")
-                if len(incorrect) > 5:
-                    print(f"    ... and {len(incorrect) - 5} more")
-    else:
-        print("Skipping Anthropic tests: ANTHROPIC_API_KEY not set")
+
+    close_classifiers()
+
+    if all_metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            json.dump(all_metrics, f, indent=2)
+        print(f"Metrics written to {args.metrics}")
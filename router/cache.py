@@ -0,0 +1,123 @@
+import time
+import json
+import sqlite3
+import hashlib
+from pathlib import Path
+from typing import Literal
+
+# Cache parameters
+CACHE_PATH = Path(__file__).resolve().parent / ".cache" / "responses.sqlite3"
+CACHE_MAX_ENTRIES = 10000
+# Hits whose last_used updates are written in one transaction
+TOUCH_BATCH = 100
+
+CacheMode = Literal["use", "refresh", "bypass"]
+CACHE_MODES = ("use", "refresh", "bypass")
+
+
+def cache_key(provider: str, model: str, rendered_prompt: str, question: str) -> str:
+    """Content address of a classification request."""
+    payload = json.dumps([provider, model, rendered_prompt, question], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Persistent classifier response cache stored in SQLite.
+
+    Entries are keyed by cache_key and evicted least-recently-used once there
+    are more than ``max_entries``. In ``refresh`` mode lookups always miss but
+    new responses are still stored; in ``bypass`` mode the cache is not used
+    at all. ``hits`` and ``misses`` count lookups since creation.
+
+    Hits only update ``last_used`` in memory; the updates are written
+    together on ``put``, on ``close`` and every ``touch_batch`` hits.
+    """
+
+    def __init__(
+        self,
+        path: str | Path = CACHE_PATH,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        mode: CacheMode = "use",
+        touch_batch: int = TOUCH_BATCH,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode!r} (expected one of {CACHE_MODES})")
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.mode = mode
+        self.touch_batch = touch_batch
+        self.touched: dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.conn = None
+        if mode != "bypass":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(self.path)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode a crash can lose the last commits but not corrupt the cache
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, response TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+            )
+            self.conn.commit()
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response for ``key``, or None on a miss."""
+        if self.mode != "use":
+            self.misses += 1
+            return None
+        row = self.conn.execute(
+            "SELECT response FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touched[key] = time.time()
+        if len(self.touched) >= self.touch_batch:
+            self.flush()
+        return row[0]
+
+    def flush(self) -> None:
+        """Write the pending last_used updates of cache hits."""
+        if self.conn is None or not self.touched:
+            return
+        self.conn.executemany(
+            "UPDATE responses SET last_used = ? WHERE key = ?",
+            [(last_used, key) for key, last_used in self.touched.items()],
+        )
+        self.touched.clear()
+        self.conn.commit()
+
+    def put(self, key: str, response: str) -> None:
+        """Store ``response`` under ``key``, evicting the least recently used entries."""
+        if self.conn is None:
+            return
+        # Evict by up-to-date last_used values
+        self.flush()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, response, last_used) VALUES (?, ?, ?)",
+            (key, response, time.time()),
+        )
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM responses WHERE key IN"
+                " (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self.conn.commit()
+
+    def stats(self) -> tuple[int, int]:
+        """Return (hits, misses)."""
+        return self.hits, self.misses
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.flush()
+            self.conn.close()
+            self.conn = None
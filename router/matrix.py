@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+from typing import NamedTuple, TextIO
+
+from app import (
+    CONCURRENCY,
+    DEFAULT_MODELS,
+    MAX_SAMPLES,
+    REQUESTS_PER_SECOND,
+    SEED,
+    DifficultyClassifier,
+    TokenBucket,
+    build_local_router,
+    route_locally,
+    sample_test_data,
+    score_predictions,
+)
+from cache import CACHE_MODES, CacheMode, ResponseCache
+from metrics import compute_metrics
+from rules import LocalRouter
+
+# Matrix defaults
+DATASET_PATH = "../external/nsum/Dataset/Test_Dataset_with_Splits"
+SPLITS = ("Easy", "Medium", "Hard")
+OUTPUT_PATH = "matrix.jsonl"
+
+
+class Cell(NamedTuple):
+    """One evaluation: a provider's model on a sampled split."""
+
+    provider: str
+    model: str
+    split: str
+    seed: int
+
+
+def parse_target(value: str) -> tuple[str, str]:
+    """Parse ``provider`` or ``provider:model`` into (provider, model)."""
+    provider, _, model = value.partition(":")
+    if provider not in DEFAULT_MODELS:
+        raise argparse.ArgumentTypeError(
+            f"Unknown provider: {provider!r} (expected one of {tuple(DEFAULT_MODELS)})"
+        )
+    return provider, model or DEFAULT_MODELS[provider]
+
+
+def build_matrix(
+    targets: list[tuple[str, str]], splits: list[str], seeds: list[int]
+) -> list[Cell]:
+    """Every (provider, model) target crossed with every split and seed."""
+    return [
+        Cell(provider, model, split, seed)
+        for provider, model in targets
+        for split in splits
+        for seed in seeds
+    ]
+
+
+class MatrixRunner:
+    """Runs evaluation cells concurrently on one event loop.
+
+    Cells of the same provider share one semaphore of ``concurrency``
+    in-flight requests and one token bucket of ``rps`` requests per second,
+    whatever their model, so adding cells does not multiply the load on a
+    provider. Each (provider, model) keeps a single classifier, and each seed
+    its own local router, for the whole run.
+    """
+
+    def __init__(
+        self,
+        dataset_path: str = DATASET_PATH,
+        max_samples: int = MAX_SAMPLES,
+        concurrency: int = CONCURRENCY,
+        rps: float | None = REQUESTS_PER_SECOND,
+        cache_mode: CacheMode = "use",
+        local: str = "none",
+    ):
+        self.dataset_path = dataset_path
+        self.max_samples = max_samples
+        self.concurrency = concurrency
+        self.rps = rps
+        self.cache_mode = cache_mode
+        self.local = local
+        self.classifiers: dict[tuple[str, str], DifficultyClassifier] = {}
+        self.limits: dict[str, tuple[asyncio.Semaphore, TokenBucket | None]] = {}
+        self.local_routers: dict[int, LocalRouter | None] = {}
+
+    def classifier(self, provider: str, model: str) -> DifficultyClassifier:
+        classifier = self.classifiers.get((provider, model))
+        if classifier is None:
+            classifier = DifficultyClassifier(
+                provider,
+                model=model,
+                max_connections=self.concurrency,
+                cache=ResponseCache(mode=self.cache_mode),
+            )
+            self.classifiers[provider, model] = classifier
+        return classifier
+
+    def limit(self, provider: str) -> tuple[asyncio.Semaphore, TokenBucket | None]:
+        limit = self.limits.get(provider)
+        if limit is None:
+            bucket = TokenBucket(self.rps) if self.rps else None
+            limit = (asyncio.Semaphore(self.concurrency), bucket)
+            self.limits[provider] = limit
+        return limit
+
+    def local_router(self, seed: int, splits: list[str]) -> LocalRouter | None:
+        if seed not in self.local_routers:
+            self.local_routers[seed] = build_local_router(
+                self.local, self.dataset_path, splits, seed=seed, max_samples=self.max_samples
+            )
+        return self.local_routers[seed]
+
+    async def run_cell(self, cell: Cell, local_router: LocalRouter | None = None) -> dict:
+        """Evaluate one cell and return its JSON-serialisable record."""
+        start = time.perf_counter()
+        test_data, loaded = await asyncio.to_thread(
+            sample_test_data, self.dataset_path, cell.split, cell.seed, self.max_samples
+        )
+        predictions, tiers, latencies = route_locally(test_data, local_router)
+
+        escalated = [i for i, tier in enumerate(tiers) if tier == "llm"]
+        if escalated:
+            semaphore, bucket = self.limit(cell.provider)
+            llm_predictions = await self.classifier(cell.provider, cell.model).aclassify_many(
+                [test_data[i][0] for i in escalated],
+                return_exceptions=True,
+                semaphore=semaphore,
+                bucket=bucket,
+                detailed=True,
+            )
+            for i, predicted_difficulty in zip(escalated, llm_predictions):
+                predictions[i] = predicted_difficulty
+
+        accuracy, correct, total, results = score_predictions(
+            test_data, predictions, tiers, latencies, verbose=False
+        )
+        elapsed = time.perf_counter() - start
+        return {
+            **cell._asdict(),
+            "loaded": loaded,
+            "total": total,
+            "correct": correct,
+            "accuracy": accuracy,
+            "escalated": len(escalated),
+            "elapsed": elapsed,
+            "error": None,
+            "metrics": compute_metrics(results, elapsed, cell.model),
+            "results": results,
+        }
+
+    async def run(self, cells: list[Cell], out: TextIO | None = None) -> list[dict]:
+        """Run every cell concurrently, writing one JSON line to ``out`` as each finishes.
+
+        A failing cell is recorded with its error instead of stopping the run.
+        Records are returned in completion order.
+        """
+        splits = sorted({cell.split for cell in cells})
+        routers = {seed: self.local_router(seed, splits) for seed in {cell.seed for cell in cells}}
+
+        async def run_cell(cell: Cell) -> dict:
+            try:
+                return await self.run_cell(cell, routers[cell.seed])
+            except Exception as e:
+                return {**cell._asdict(), "error": f"{type(e).__name__}: {e}"}
+
+        records = []
+        for finished in asyncio.as_completed([run_cell(cell) for cell in cells]):
+            record = await finished
+            records.append(record)
+            if out is not None:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+            print(format_record(record))
+        return records
+
+    async def aclose(self) -> None:
+        while self.classifiers:
+            _, classifier = self.classifiers.popitem()
+            await classifier.aclose()
+
+
+def format_record(record: dict) -> str:
+    """One-line summary of a cell record."""
+    name = f"{record['provider']}:{record['model']} {record['split']} seed={record['seed']}"
+    if record["error"]:
+        return f"{name}: ERROR {record['error']}"
+    return (
+        f"{name}: {record['accuracy']:.2%} ({record['correct']}/{record['total']}), "
+        f"{record['escalated']} escalated, {record['elapsed']:.2f}s, "
+        f"p95 {(record['metrics']['latency']['p95'] or 0) * 1000:.0f} ms"
+    )
+
+
+async def run_matrix(cells: list[Cell], output: str | None = OUTPUT_PATH, **kwargs) -> list[dict]:
+    """Run ``cells`` with a MatrixRunner (``kwargs`` go to its constructor), streaming JSONL to ``output``."""
+    runner = MatrixRunner(**kwargs)
+    out = open(output, "w", encoding="utf-8") if output else None
+    try:
+        return await runner.run(cells, out)
+    finally:
+        if out is not None:
+            out.close()
+        await runner.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Evaluate the classifier over providers x models x splits x seeds concurrently"
+    )
+    parser.add_argument(
+        "--target",
+        type=parse_target,
+        action="append",
+        help="provider or provider:model to evaluate, repeatable (default: the default model of every provider with an API key)",
+    )
+    parser.add_argument(
+        "--split",
+        action="append",
+        help=f"Dataset split, repeatable (default: {', '.join(SPLITS)})",
+    )
+    parser.add_argument(
+        "--seed", type=int, action="append", help=f"Sampling seed, repeatable (default: {SEED})"
+    )
+    parser.add_argument(
+        "--max-samples", type=int, default=MAX_SAMPLES, help=f"Questions per cell (default: {MAX_SAMPLES})"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=CONCURRENCY,
+        help=f"In-flight requests per provider (default: {CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--rps",
+        type=float,
+        default=REQUESTS_PER_SECOND,
+        help=f"Requests started per second per provider, 0 for no limit (default: {REQUESTS_PER_SECOND})",
+    )
+    parser.add_argument(
+        "--cache", choices=CACHE_MODES, default="use", help="Response cache mode (default: use)"
+    )
+    parser.add_argument(
+        "--local",
+        choices=("none", "rules", "knn"),
+        default="none",
+        help="Local tiers tried before the LLM (default: none)",
+    )
+    parser.add_argument(
+        "--dataset", default=DATASET_PATH, help=f"Directory of split TSVs (default: {DATASET_PATH})"
+    )
+    parser.add_argument(
+        "--output", default=OUTPUT_PATH, help=f"JSONL file for cell records (default: {OUTPUT_PATH})"
+    )
+    args = parser.parse_args()
+
+    targets = args.target or [(provider, model) for provider, model in DEFAULT_MODELS.items()]
+    available = []
+    for provider, model in targets:
+        env_var = f"{provider.upper()}_API_KEY"
+        if os.getenv(env_var):
+            available.append((provider, model))
+        else:
+            print(f"Skipping {provider}:{model}: {env_var} not set")
+
+    cells = build_matrix(available, args.split or list(SPLITS), args.seed or [SEED])
+    if not cells:
+        raise SystemExit("Nothing to evaluate")
+
+    print(f"Running {len(cells)} cells")
+    start = time.perf_counter()
+    records = asyncio.run(
+        run_matrix(
+            cells,
+            output=args.output,
+            dataset_path=args.dataset,
+            max_samples=args.max_samples,
+            concurrency=args.concurrency,
+            rps=args.rps or None,
+            cache_mode=args.cache,
+            local=args.local,
+        )
+    )
+    wall = time.perf_counter() - start
+    cell_time = sum(r.get("elapsed", 0.0) for r in records)
+    failed = sum(1 for r in records if r["error"])
+    print(f"Finished {len(records)} cells ({failed} failed) in {wall:.2f}s wall time, {cell_time:.2f}s of cell time")
+    print(f"Results written to {args.output}")
@@ -0,0 +1,114 @@
+import math
+from collections import Counter
+
+LABELS = ("easy", "medium", "hard")
+
+# USD per million (input, output) tokens
+PRICING = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "claude-sonnet-4-5-20250929": (3.00, 15.00),
+    "claude-haiku-4-5-20251001": (1.00, 5.00),
+}
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """The ``q``-th percentile (0-100) of ``values`` with linear interpolation."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    low = math.floor(position)
+    high = math.ceil(position)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def confusion_matrix(results: list[dict]) -> dict[str, dict[str, int]]:
+    """Counts of predicted labels per expected label.
+
+    Rows and columns cover LABELS plus any other label seen, such as
+    ``"ERROR"`` or an unparsable answer.
+    """
+    labels = list(LABELS)
+    for r in results:
+        for label in (r["expected"], r["predicted"]):
+            if label not in labels:
+                labels.append(label)
+    matrix = {expected: {predicted: 0 for predicted in labels} for expected in labels}
+    for r in results:
+        matrix[r["expected"]][r["predicted"]] += 1
+    return matrix
+
+
+def compute_metrics(results: list[dict], wall_time: float, model: str | None = None) -> dict:
+    """Aggregate per-question results into a JSON-serialisable summary.
+
+    ``wall_time`` is the time taken by the whole evaluation and gives the
+    throughput. The cost per 1k questions uses PRICING and is None for
+    models without a price.
+    """
+    total = len(results)
+    latencies = [r["latency"] for r in results]
+    input_tokens = sum(r.get("input_tokens", 0) for r in results)
+    output_tokens = sum(r.get("output_tokens", 0) for r in results)
+    cost = None
+    if model in PRICING:
+        input_price, output_price = PRICING[model]
+        cost = (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+    return {
+        "model": model,
+        "total": total,
+        "correct": sum(1 for r in results if r["correct"]),
+        "accuracy": sum(1 for r in results if r["correct"]) / total if total else 0.0,
+        "confusion_matrix": confusion_matrix(results),
+        "latency": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / total if total else None,
+        },
+        "wall_time": wall_time,
+        "throughput": total / wall_time if wall_time > 0 else None,
+        "tokens": {
+            "input": input_tokens,
+            "output": output_tokens,
+            "cached_answers": sum(1 for r in results if r.get("cached")),
+        },
+        "cost": cost,
+        "cost_per_1k": cost / total * 1000 if cost is not None and total else None,
+        "errors": dict(Counter(r["error"] for r in results if r.get("error"))),
+    }
+
+
+def format_metrics(metrics: dict) -> list[str]:
+    """Report lines for the metrics returned by compute_metrics."""
+    latency = metrics["latency"]
+    lines = []
+    if latency["p50"] is not None:
+        lines.append(
+            f"  Latency: p50 {latency['p50'] * 1000:.1f} ms, p95 {latency['p95'] * 1000:.1f} ms, "
+            f"p99 {latency['p99'] * 1000:.1f} ms"
+        )
+    if metrics["throughput"] is not None:
+        lines.append(f"  Throughput: {metrics['throughput']:.2f} questions/s")
+    tokens = metrics["tokens"]
+    lines.append(
+        f"  Tokens: {tokens['input']} input, {tokens['output']} output "
+        f"({tokens['cached_answers']} cached answers)"
+    )
+    if metrics["cost_per_1k"] is not None:
+        lines.append(f"  Cost: ${metrics['cost']:.4f} (${metrics['cost_per_1k']:.4f} per 1k questions)")
+    if metrics["errors"]:
+        errors = ", ".join(f"{name} x{count}" for name, count in sorted(metrics["errors"].items()))
+        lines.append(f"  Errors: {errors}")
+
+    matrix = metrics["confusion_matrix"]
+    labels = list(matrix)
+    width = max(len(label) for label in labels)
+    lines.append("  Confusion matrix (rows: expected, columns: predicted):")
+    lines.append("    " + " " * width + "  " + "  ".join(f"{label:>{width}}" for label in labels))
+    for expected in labels:
+        counts = "  ".join(f"{matrix[expected][predicted]:>{width}}" for predicted in labels)
+        lines.append(f"    {expected:<{width}}  {counts}")
+    return lines
@@ -0,0 +1,117 @@
+import re
+import math
+from collections import Counter, defaultdict
+
+# Surface patterns that decide difficulty on their own, taken from EXAMPLES
+RULES = [
+    (re.compile(r"\b(?:teens|twenties|thirties|forties|fifties)\b", re.IGNORECASE), "hard"),
+    (re.compile(r"\bmost recent\b", re.IGNORECASE), "medium"),
+    (re.compile(r"\bwon the most\b", re.IGNORECASE), "medium"),
+    (re.compile(r"^how many\b.*\bin (?:the )?\d{4}\b", re.IGNORECASE), "easy"),
+    (re.compile(r"\bmore \w+(?: \w+)? than\b", re.IGNORECASE), "easy"),
+    (re.compile(r"^list all\b", re.IGNORECASE), "easy"),
+]
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Nearest-neighbour parameters
+K_NEIGHBOURS = 5
+MIN_CONFIDENCE = 0.8
+MIN_SIMILARITY = 0.3
+
+
+def classify_by_rules(question: str) -> str | None:
+    """Return the difficulty decided by RULES, or None when no rule or conflicting rules match."""
+    labels = {label for pattern, label in RULES if pattern.search(question)}
+    return labels.pop() if len(labels) == 1 else None
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word unigrams and bigrams."""
+    words = TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class NearestNeighbourClassifier:
+    """TF-IDF k-nearest-neighbour classifier trained on labelled questions.
+
+    A prediction is only returned when the ``k`` most similar training
+    questions agree on a label by at least ``min_confidence`` of the
+    similarity-weighted vote and the closest one has cosine similarity of at
+    least ``min_similarity``.
+    """
+
+    def __init__(
+        self,
+        k: int = K_NEIGHBOURS,
+        min_confidence: float = MIN_CONFIDENCE,
+        min_similarity: float = MIN_SIMILARITY,
+    ):
+        self.k = k
+        self.min_confidence = min_confidence
+        self.min_similarity = min_similarity
+        self.idf: dict[str, float] = {}
+        self.labels: list[str] = []
+        # term -> [(document index, weight)], for sparse dot products
+        self.postings: dict[str, list[tuple[int, float]]] = defaultdict(list)
+
+    def _vector(self, tokens: list[str]) -> dict[str, float]:
+        counts = Counter(t for t in tokens if t in self.idf)
+        vector = {t: c * self.idf[t] for t, c in counts.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {t: w / norm for t, w in vector.items()} if norm else {}
+
+    def fit(self, data: list[tuple[str, str]]) -> "NearestNeighbourClassifier":
+        """Train on (question, difficulty) pairs."""
+        documents = [tokenize(question) for question, _ in data]
+        df = Counter(t for tokens in documents for t in set(tokens))
+        n = len(documents)
+        self.idf = {t: math.log((1 + n) / (1 + d)) + 1 for t, d in df.items()}
+        self.labels = [label for _, label in data]
+        self.postings = defaultdict(list)
+        for i, tokens in enumerate(documents):
+            for t, w in self._vector(tokens).items():
+                self.postings[t].append((i, w))
+        return self
+
+    def predict(self, question: str) -> tuple[str | None, float]:
+        """Return (difficulty or None, confidence)."""
+        scores: dict[int, float] = defaultdict(float)
+        for t, w in self._vector(tokenize(question)).items():
+            for i, dw in self.postings.get(t, ()):
+                scores[i] += w * dw
+        if not scores:
+            return None, 0.0
+        neighbours = sorted(scores.items(), key=lambda item: item[1], reverse=True)[: self.k]
+        if neighbours[0][1] < self.min_similarity:
+            return None, 0.0
+        votes: dict[str, float] = defaultdict(float)
+        for i, similarity in neighbours:
+            votes[self.labels[i]] += similarity
+        label, weight = max(votes.items(), key=lambda item: item[1])
+        confidence = weight / sum(votes.values())
+        return (label if confidence >= self.min_confidence else None), confidence
+
+
+class LocalRouter:
+    """Local pre-classifier tiers that answer confident cases before the LLM.
+
+    Questions go through the pattern rules, then the optional nearest-neighbour
+    model; ``classify`` returns the label and the tier that decided it, or
+    ``(None, "llm")`` when the question should be escalated.
+    """
+
+    def __init__(self, knn: NearestNeighbourClassifier | None = None, use_rules: bool = True):
+        self.knn = knn
+        self.use_rules = use_rules
+
+    def classify(self, question: str) -> tuple[str | None, str]:
+        if self.use_rules:
+            label = classify_by_rules(question)
+            if label:
+                return label, "rules"
+        if self.knn is not None:
+            label, _ = self.knn.predict(question)
+            if label:
+                return label, "knn"
+        return None, "llm"
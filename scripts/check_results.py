@@ -6,30 +6,239 @@ This script walks through .output/{seed}/{experiment}/ directories,
 compares the expected answers from {experiment}.txt with the actual
 answers from result.txt, and generates a detailed report with diffs.
 
+Experiments are checked by a pool of worker processes. Results are kept in
+an index file inside the output directory, keyed by experiment and validated
+by the size, mtime and content hash of its files, so a rerun only rechecks
+experiments whose files changed. Diffs are only computed for the failures a
+report or the interactive explorer shows, and the report is streamed section
+by section.
+
+With --table the results are also written as a table with one row per
+experiment, as JSONL or (with pyarrow installed) Parquet or Arrow IPC,
+picked by the file extension.
+
 Usage:
     python scripts/check_results.py [--output-dir .output] [--report report.txt] [--debug]
+                                    [--jobs N] [--no-index] [--summary-only]
+                                    [--table results.parquet] [--table results.jsonl]
 """
 
 import argparse
 import csv
 import difflib
+import hashlib
+import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
 import re
 
+# Worker processes used to check experiments
+JOBS = os.cpu_count() or 1
+
+# Cached results, stored in the output directory
+INDEX_NAME = ".check_index.json"
+INDEX_VERSION = 2
+
+# Longest answer (in characters) given to the O(n*m) character diff; longer
+# answers get a cheap first-difference summary instead
+MAX_DIFF_LENGTH = 2000
+# Characters of context shown around the first difference
+DIFF_CONTEXT = 40
+
+# Result fields stored as sets in memory and as sorted lists in the index
+SET_FIELDS = ("normalized_expected", "normalized_actual")
+
+# Results table formats by file extension
+TABLE_FORMATS = {
+    ".jsonl": "jsonl",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+
+# Columns of the results table and their types
+RESULT_COLUMNS = [
+    ("run", "string"),
+    ("seed", "string"),
+    ("experiment", "string"),
+    ("split", "string"),
+    ("question", "string"),
+    ("expected", "string"),
+    ("actual", "string"),
+    ("match", "bool"),
+    ("normalized_expected", "list<string>"),
+    ("normalized_actual", "list<string>"),
+]
+
+# Task directories generated from a split are named {split}_{row}
+TASK_NAME_RE = re.compile(r"^(?P<split>.+?)_(?P<row>\d+)$")
+
+
+def task_split(experiment: str) -> str:
+    """The dataset split of a task directory name (``Easy_3`` -> ``Easy``)."""
+    m = TASK_NAME_RE.match(experiment)
+    return m.group("split") if m else experiment
+
+
+def file_stamp(path: Path) -> List[int]:
+    """Size and modification time of a file."""
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def file_hash(path: Path) -> str:
+    """SHA-1 of a file's contents."""
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+class ResultIndex:
+    """Check results of previous runs, keyed by experiment.
+
+    An entry is reused while the size and mtime of its files are unchanged,
+    or when they changed but the contents hash the same (e.g. after a copy).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict] = {}
+        self.dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.entries = data["entries"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def get(self, key: str, files: List[Path]) -> Tuple[bool, Optional[Dict]]:
+        """Return (found, result) for ``key`` if its files are unchanged."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        stamps = [file_stamp(f) for f in files]
+        if entry["stamps"] != stamps:
+            if entry["hashes"] != [file_hash(f) for f in files]:
+                return False, None
+            entry["stamps"] = stamps
+            self.dirty = True
+        result = entry["result"]
+        if result is not None:
+            result = dict(result)
+            for field in SET_FIELDS:
+                result[field] = set(result[field])
+        return True, result
+
+    def put(self, key: str, files: List[Path], result: Optional[Dict]) -> None:
+        """Store the result of ``key`` with the current state of its files."""
+        if result is not None:
+            result = dict(result)
+            for field in SET_FIELDS:
+                result[field] = sorted(result[field])
+        self.entries[key] = {
+            "stamps": [file_stamp(f) for f in files],
+            "hashes": [file_hash(f) for f in files],
+            "result": result,
+        }
+        self.dirty = True
+
+    def prune(self, keys: set) -> None:
+        """Drop the entries of experiments that no longer exist."""
+        stale = [key for key in self.entries if key not in keys]
+        for key in stale:
+            del self.entries[key]
+        self.dirty = self.dirty or bool(stale)
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "entries": self.entries}, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+def write_rows(rows: Iterable[Dict], output_file: str, columns: List[Tuple[str, str]]) -> None:
+    """Write rows as JSONL, Parquet or Arrow IPC, picked by the file extension.
+
+    ``columns`` lists the name and type of every column ("string", "bool",
+    "int", "float" or "list<string>"); the columnar formats need pyarrow.
+    """
+    fmt = TABLE_FORMATS.get(Path(output_file).suffix.lower())
+    if fmt is None:
+        raise ValueError(
+            f"Unknown table format for {output_file} (expected one of {', '.join(TABLE_FORMATS)})"
+        )
+
+    if fmt == "jsonl":
+        with open(output_file, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        return
+
+    # pyarrow is only needed for the columnar formats
+    import pyarrow as pa
+
+    types = {
+        "string": pa.string(),
+        "bool": pa.bool_(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "list<string>": pa.list_(pa.string()),
+    }
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    table = pa.Table.from_pylist(list(rows), schema=schema)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, output_file)
+    else:
+        with pa.ipc.new_file(output_file, schema) as writer:
+            writer.write_table(table)
+
+
+# Checker of the current worker process
+_checker = None
+
+
+def init_worker(debug: bool = False) -> None:
+    """Create the checker used by check_worker in the current (worker) process."""
+    global _checker
+    _checker = ResultChecker(debug=debug)
+
+
+def check_worker(task: Tuple[str, str, Path]) -> Optional[Dict]:
+    """Check one (seed_id, experiment, experiment_dir) in a worker process."""
+    if _checker is None:
+        init_worker()
+    return _checker.check_experiment(*task)
+
 
 class ResultChecker:
     """Check and compare expected vs actual results."""
 
-    def __init__(self, output_dir: str = ".output", debug: bool = False):
+    def __init__(
+        self,
+        output_dir: str = ".output",
+        debug: bool = False,
+        jobs: int = JOBS,
+        use_index: bool = True,
+    ):
         self.output_dir = Path(output_dir)
         self.debug = debug
+        self.jobs = jobs
+        self.use_index = use_index
         self.results: List[Dict] = []
         self.total_checks = 0
         self.passed = 0
         self.failed = 0
+        # Experiments taken from the index vs. checked in this run
+        self.reused = 0
+        self.checked = 0
 
     def normalize_answer(self, answer: str) -> set:
         """Normalize answer for comparison by splitting on commas and trimming elements."""
@@ -45,7 +254,13 @@ class ResultChecker:
         return "\n".join(diff) if diff else "No differences"
 
     def get_character_diff(self, expected: str, actual: str) -> str:
-        """Generate a more detailed character-by-character comparison."""
+        """Generate a more detailed character-by-character comparison.
+
+        Answers longer than MAX_DIFF_LENGTH fall back to get_first_difference.
+        """
+        if max(len(expected), len(actual)) > MAX_DIFF_LENGTH:
+            return self.get_first_difference(expected, actual)
+
         matcher = difflib.SequenceMatcher(None, expected, actual)
 
         result = []
@@ -61,8 +276,37 @@ class ResultChecker:
 
         return " ".join(result) if result else "No character differences"
 
-    def read_expected_answer(self, filepath: Path) -> Optional[str]:
-        """Read the expected answer from a CSV/TSV file."""
+    def get_first_difference(self, expected: str, actual: str) -> str:
+        """Summarise where two long answers start to differ, in linear time."""
+        position = next(
+            (i for i, (a, b) in enumerate(zip(expected, actual)) if a != b),
+            min(len(expected), len(actual)),
+        )
+        if position == len(expected) == len(actual):
+            return "No character differences"
+        start = max(0, position - DIFF_CONTEXT)
+        end = position + DIFF_CONTEXT
+        return (
+            f"Answers too long for a character diff ({len(expected)} vs {len(actual)} characters); "
+            f"first difference at position {position}: "
+            f"[-{repr(expected[start:end])}+{repr(actual[start:end])}]"
+        )
+
+    def get_diffs(self, result: Dict) -> Tuple[str, str]:
+        """Return the (full diff, character diff) of a failed result.
+
+        Diffs are only computed when first shown, then kept in the result.
+        """
+        if "diff" not in result:
+            result["diff"] = self.get_detailed_diff(result["expected"], result["actual"])
+            result["char_diff"] = self.get_character_diff(result["expected"], result["actual"])
+        return result["diff"], result["char_diff"]
+
+    def read_expected_file(self, filepath: Path) -> Tuple[Optional[str], Optional[str]]:
+        """Read the (question, expected answer) pair from a CSV/TSV file.
+
+        The file is parsed once; either item is None if it cannot be read.
+        """
         try:
             with open(filepath, "r", encoding="utf-8") as f:
                 # Detect delimiter: tab first, then comma
@@ -75,20 +319,25 @@ class ResultChecker:
                     delimiter = ","
 
                 reader = csv.reader(f, delimiter=delimiter)
-                rows = list(reader)
-
-                if len(rows) < 2:
-                    return None
 
-                # First row is header, second row contains data
-                # Second column (index 1) is the answer
-                if len(rows[1]) >= 2:
-                    return rows[1][1]
-                return None
+                # First row is header, second row contains data:
+                # the question is in the first column, the answer in the second
+                if next(reader, None) is None:
+                    return None, None
+                row = next(reader, None)
+                if row is None:
+                    return None, None
+                question = row[0] if len(row) >= 1 else None
+                answer = row[1] if len(row) >= 2 else None
+                return question, answer
         except Exception as e:
             if self.debug:
                 print(f"Error reading {filepath}: {e}", file=sys.stderr)
-            return None
+            return None, None
+
+    def read_expected_answer(self, filepath: Path) -> Optional[str]:
+        """Read the expected answer from a CSV/TSV file."""
+        return self.read_expected_file(filepath)[1]
 
     def read_actual_answer(self, filepath: Path) -> Optional[str]:
         """Read the actual answer from result.txt."""
@@ -102,32 +351,7 @@ class ResultChecker:
 
     def read_question(self, filepath: Path) -> Optional[str]:
         """Read the question from a CSV/TSV file."""
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                # Detect delimiter: tab first, then comma
-                sample = f.read(1024)
-                f.seek(0)
-
-                if "\t" in sample:
-                    delimiter = "\t"
-                else:
-                    delimiter = ","
-
-                reader = csv.reader(f, delimiter=delimiter)
-                rows = list(reader)
-
-                if len(rows) < 2:
-                    return None
-
-                # First row is header, second row contains data
-                # First column (index 0) is the question
-                if len(rows[1]) >= 1:
-                    return rows[1][0]
-                return None
-        except Exception as e:
-            if self.debug:
-                print(f"Error reading {filepath}: {e}", file=sys.stderr)
-            return None
+        return self.read_expected_file(filepath)[0]
 
     def check_experiment(
         self, seed_id: str, experiment: str, experiment_dir: Path
@@ -148,8 +372,7 @@ class ResultChecker:
             return None
 
         # Read question, expected answer, and actual answer
-        question = self.read_question(expected_file)
-        expected_answer = self.read_expected_answer(expected_file)
+        question, expected_answer = self.read_expected_file(expected_file)
         actual_answer = self.read_actual_answer(result_file)
 
         if question is None or expected_answer is None or actual_answer is None:
@@ -172,22 +395,17 @@ class ResultChecker:
             "normalized_expected": normalized_expected,
             "normalized_actual": normalized_actual,
             "match": is_match,
-            "diff": (
-                self.get_detailed_diff(expected_answer, actual_answer)
-                if not is_match
-                else None
-            ),
-            "char_diff": (
-                self.get_character_diff(expected_answer, actual_answer)
-                if not is_match
-                else None
-            ),
         }
 
         return result
 
     def run_checks(self) -> None:
-        """Run checks on all experiments in the output directory."""
+        """Run checks on all experiments in the output directory.
+
+        Experiments whose files are unchanged since the last run are taken
+        from the index; the others are checked by ``jobs`` worker processes.
+        Results keep the seed/experiment order.
+        """
         if not self.output_dir.exists():
             print(
                 f"Error: Output directory {self.output_dir} does not exist",
@@ -195,32 +413,67 @@ class ResultChecker:
             )
             sys.exit(1)
 
-        # Walk through seed directories
+        index = ResultIndex(self.output_dir / INDEX_NAME) if self.use_index else None
+
+        # Walk through seed and experiment directories
+        tasks = []
         for seed_dir in sorted(self.output_dir.iterdir()):
             if not seed_dir.is_dir():
                 continue
-
-            seed_id = seed_dir.name
-
-            # Walk through experiment directories
             for experiment_dir in sorted(seed_dir.iterdir()):
-                if not experiment_dir.is_dir():
+                if experiment_dir.is_dir():
+                    tasks.append((seed_dir.name, experiment_dir.name, experiment_dir))
+
+        results: List[Optional[Dict]] = [None] * len(tasks)
+        pending = []
+        for i, (seed_id, experiment, experiment_dir) in enumerate(tasks):
+            files = [experiment_dir / f"{experiment}.txt", experiment_dir / "result.txt"]
+            if index is not None and all(f.exists() for f in files):
+                found, results[i] = index.get(f"{seed_id}/{experiment}", files)
+                if found:
+                    self.reused += 1
                     continue
+            pending.append(i)
+
+        # Check everything that changed
+        pending_tasks = [tasks[i] for i in pending]
+        if self.jobs > 1 and len(pending_tasks) > 1:
+            jobs = min(self.jobs, len(pending_tasks))
+            with ProcessPoolExecutor(
+                max_workers=jobs, initializer=init_worker, initargs=(self.debug,)
+            ) as executor:
+                chunksize = max(1, len(pending_tasks) // (jobs * 4))
+                checked = list(executor.map(check_worker, pending_tasks, chunksize=chunksize))
+        else:
+            checked = [self.check_experiment(*task) for task in pending_tasks]
+        self.checked += len(pending_tasks)
+
+        for i, result in zip(pending, checked):
+            results[i] = result
+            seed_id, experiment, experiment_dir = tasks[i]
+            files = [experiment_dir / f"{experiment}.txt", experiment_dir / "result.txt"]
+            if index is not None and all(f.exists() for f in files):
+                index.put(f"{seed_id}/{experiment}", files, result)
+
+        if index is not None:
+            index.prune({f"{seed_id}/{experiment}" for seed_id, experiment, _ in tasks})
+            index.save()
+
+        for result in results:
+            if result:
+                self.results.append(result)
+                self.total_checks += 1
+                if result["match"]:
+                    self.passed += 1
+                else:
+                    self.failed += 1
 
-                experiment = experiment_dir.name
-
-                # Check this experiment
-                result = self.check_experiment(seed_id, experiment, experiment_dir)
-                if result:
-                    self.results.append(result)
-                    self.total_checks += 1
-                    if result["match"]:
-                        self.passed += 1
-                    else:
-                        self.failed += 1
+    def iter_report(self, details: bool = True) -> Iterator[List[str]]:
+        """Yield the report section by section, each as a list of lines.
 
-    def generate_report(self, output_file: Optional[str] = None) -> str:
-        """Generate a detailed report of the results."""
+        Without ``details`` the per-failure section is left out, and no diffs
+        are computed.
+        """
         lines = []
 
         # Header
@@ -236,8 +489,10 @@ class ResultChecker:
                 f"Success rate: {(self.passed / self.total_checks) * 100:.1f}%"
             )
         lines.append("")
+        yield lines
 
         # Summary by seed
+        lines = []
         lines.append("-" * 80)
         lines.append("SUMMARY BY SEED")
         lines.append("-" * 80)
@@ -261,8 +516,10 @@ class ResultChecker:
             )
 
         lines.append("")
+        yield lines
 
         # Summary by experiment
+        lines = []
         lines.append("-" * 80)
         lines.append("SUMMARY BY EXPERIMENT")
         lines.append("-" * 80)
@@ -286,16 +543,16 @@ class ResultChecker:
             )
 
         lines.append("")
+        yield lines
 
-        # Detailed failures
-        if self.failed > 0:
-            lines.append("=" * 80)
-            lines.append("DETAILED FAILURES")
-            lines.append("=" * 80)
-            lines.append("")
+        # Detailed failures, one section per failure
+        if details and self.failed > 0:
+            yield ["=" * 80, "DETAILED FAILURES", "=" * 80, ""]
 
             for result in self.results:
                 if not result["match"]:
+                    diff, char_diff = self.get_diffs(result)
+                    lines = []
                     lines.append("-" * 80)
                     lines.append(
                         f"Seed: {result['seed_id']} | Experiment: {result['experiment']}"
@@ -311,31 +568,61 @@ class ResultChecker:
                     lines.append(f"  Actual:   {result['normalized_actual']}")
                     lines.append("")
                     lines.append("Character-level diff:")
-                    lines.append(f"  {result['char_diff']}")
+                    lines.append(f"  {char_diff}")
                     lines.append("")
-                    if result["diff"]:
+                    if diff:
                         lines.append("Full diff:")
-                        for line in result["diff"].split("\n"):
+                        for line in diff.split("\n"):
                             lines.append(f"  {line}")
                     lines.append("")
+                    yield lines
 
         # Successful checks
         if self.debug and self.passed > 0:
-            lines.append("=" * 80)
-            lines.append("SUCCESSFUL CHECKS")
-            lines.append("=" * 80)
-            lines.append("")
+            yield ["=" * 80, "SUCCESSFUL CHECKS", "=" * 80, ""]
 
             for result in self.results:
                 if result["match"]:
+                    lines = []
                     lines.append(
                         f"✓ Seed: {result['seed_id']} | Experiment: {result['experiment']}"
                     )
                     lines.append(f"  Question: {result['question'][:80]}...")
                     lines.append(f"  Answer: {result['expected'][:80]}...")
                     lines.append("")
+                    yield lines
+
+    def write_report(
+        self,
+        output_file: Optional[str] = None,
+        echo: bool = True,
+        details: bool = True,
+    ) -> None:
+        """Stream the report section by section to ``output_file`` and/or stdout.
+
+        Only one section is held in memory at a time.
+        """
+        f = open(output_file, "w", encoding="utf-8") if output_file else None
+        try:
+            first = True
+            for section in self.iter_report(details=details):
+                if not section:
+                    continue
+                text = "\n".join(section)
+                if f is not None:
+                    f.write(text if first else "\n" + text)
+                if echo:
+                    print(text)
+                first = False
+        finally:
+            if f is not None:
+                f.close()
+        if output_file:
+            print(f"Report written to {output_file}")
 
-        report = "\n".join(lines)
+    def generate_report(self, output_file: Optional[str] = None) -> str:
+        """Generate a detailed report of the results."""
+        report = "\n".join(line for section in self.iter_report() for line in section)
 
         # Write to file if specified
         if output_file:
@@ -345,6 +632,27 @@ class ResultChecker:
 
         return report
 
+    def iter_table_rows(self) -> Iterator[Dict]:
+        """Yield one flat, JSON-serialisable row per checked experiment."""
+        for result in self.results:
+            yield {
+                "run": self.output_dir.name,
+                "seed": result["seed_id"],
+                "experiment": result["experiment"],
+                "split": task_split(result["experiment"]),
+                "question": result["question"],
+                "expected": result["expected"],
+                "actual": result["actual"],
+                "match": result["match"],
+                "normalized_expected": sorted(result["normalized_expected"]),
+                "normalized_actual": sorted(result["normalized_actual"]),
+            }
+
+    def write_table(self, output_file: str) -> None:
+        """Write the results table, in the format given by the file extension."""
+        write_rows(self.iter_table_rows(), output_file, RESULT_COLUMNS)
+        print(f"Results table written to {output_file}")
+
     def interactive_mode(self) -> None:
         """Run in interactive mode to explore failures."""
         print("\n" + "=" * 80)
@@ -400,16 +708,17 @@ class ResultChecker:
         print(f"Actual Answer:")
         print(f"  {failure['actual']}")
         print()
+        diff, char_diff = self.get_diffs(failure)
         print("-" * 80)
         print("Character-level differences:")
         print("-" * 80)
-        print(f"  {failure['char_diff']}")
+        print(f"  {char_diff}")
         print()
-        if failure["diff"]:
+        if diff:
             print("-" * 80)
             print("Full diff:")
             print("-" * 80)
-            for line in failure["diff"].split("\n"):
+            for line in diff.split("\n"):
                 print(f"  {line}")
         print()
 
@@ -436,16 +745,52 @@ def main():
         action="store_true",
         help="Run in interactive mode to explore failures",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=JOBS,
+        help=f"Worker processes used to check experiments (default: {JOBS})",
+    )
+    parser.add_argument(
+        "--table",
+        action="append",
+        default=[],
+        help="Also write the results table to this file, repeatable; "
+        "the extension picks the format: .jsonl, .parquet or .arrow (Parquet and Arrow need pyarrow)",
+    )
+    parser.add_argument(
+        "--summary-only",
+        action="store_true",
+        help="Leave the per-failure details and diffs out of the report",
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help=f"Recheck everything and do not read or write {INDEX_NAME}",
+    )
 
     args = parser.parse_args()
+    for table in args.table:
+        if Path(table).suffix.lower() not in TABLE_FORMATS:
+            parser.error(f"--table {table}: unknown format (expected one of {', '.join(TABLE_FORMATS)})")
 
     # Create checker and run
-    checker = ResultChecker(output_dir=args.output_dir, debug=args.debug)
+    checker = ResultChecker(
+        output_dir=args.output_dir,
+        debug=args.debug,
+        jobs=args.jobs,
+        use_index=not args.no_index,
+    )
     checker.run_checks()
+    print(
+        f"Checked {checker.checked} experiments, reused {checker.reused} from the index",
+        file=sys.stderr,
+    )
 
-    # Generate and display report
-    report = checker.generate_report(output_file=args.report)
-    print(report)
+    # Stream the report to stdout and the report file
+    checker.write_report(output_file=args.report, details=not args.summary_only)
+    for table in args.table:
+        checker.write_table(table)
 
     # Interactive mode
     if args.interactive:
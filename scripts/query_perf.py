@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+Measure the agents' final queries in the .output directory structure.
+
+This script walks through .output/{seed}/{experiment}/ directories, loads
+the task's seed ({experiment}.sql) into a scratch Postgres database and runs
+the agent's result.sql under EXPLAIN (ANALYZE, BUFFERS) a few times. Each
+experiment gets its planning and execution times, the rows returned, the
+buffers touched and a few plan statistics. Plans that look pathological are
+flagged: nested loops without a join condition (a missing join predicate)
+and nested loops that produce or discard many more rows than the query
+returns.
+
+Seeds are loaded once into template databases named after their content
+hash, so experiments with the same seed share one, and reruns skip loading.
+An experiment without a seed file uses the template built by tasks/init.py
+--backend template, if there is one. Every query runs in a transaction that
+is rolled back, with a statement timeout.
+
+The connection uses the usual PGHOST, PGUSER, ... variables, or --dsn.
+
+Usage:
+    python scripts/query_perf.py [--output-dir .output] [--repeats 5] [--timeout 10]
+                                 [--top 20] [--table perf.parquet] [--drop-templates]
+"""
+
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from check_results import TABLE_FORMATS, task_split, write_rows
+
+# The repository root, for the tasks package when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tasks.templates import (  # noqa: E402
+    build_template,
+    clone_template,
+    database_exists,
+    database_name,
+    drop_database,
+    file_digest,
+)
+
+RESULT_SQL = "result.sql"
+
+# Timed runs per query, after one untimed warm-up run
+REPEATS = 5
+# Seconds before a query is cancelled
+STATEMENT_TIMEOUT = 10
+
+# Seed templates are named after the hash of the seed file
+PERF_TEMPLATE_PREFIX = "perf_"
+SCRATCH_DATABASE = "perf_scratch"
+
+# A nested loop is flagged when it produces or discards this many times
+# more rows than the query returns (and at least BLOWUP_MIN_ROWS)
+BLOWUP_FACTOR = 100
+BLOWUP_MIN_ROWS = 1000
+
+# Plan node conditions, searched for references to the other side of a join
+CONDITION_KEYS = (
+    "Join Filter",
+    "Index Cond",
+    "Recheck Cond",
+    "Filter",
+    "Hash Cond",
+    "Merge Cond",
+)
+
+# Opening delimiter of a dollar-quoted string: $$ or $tag$
+DOLLAR_QUOTE_RE = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)?\$")
+
+# Columns of the perf table and their types
+PERF_COLUMNS = [
+    ("run", "string"),
+    ("seed", "string"),
+    ("experiment", "string"),
+    ("split", "string"),
+    ("repeats", "int"),
+    ("planning_ms", "float"),
+    ("execution_ms", "float"),
+    ("execution_min_ms", "float"),
+    ("execution_max_ms", "float"),
+    ("rows", "int"),
+    ("shared_hit", "int"),
+    ("shared_read", "int"),
+    ("temp_blocks", "int"),
+    ("nodes", "int"),
+    ("nested_loops", "int"),
+    ("max_loops", "int"),
+    ("max_node_rows", "int"),
+    ("rows_removed", "int"),
+    ("flags", "list<string>"),
+    ("error", "string"),
+]
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a script on semicolons outside quotes and comments.
+
+    Quotes include dollar quotes ($$ ... $$ or $tag$ ... $tag$), as in
+    function bodies and DO blocks. Comments are dropped; empty statements
+    are skipped.
+    """
+    statements = []
+    current = []
+    i = 0
+    n = len(sql)
+    while i < n:
+        c = sql[i]
+        if c == "-" and sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        if c == "/" and sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            current.append(" ")
+            continue
+        if c in "'\"":
+            end = i + 1
+            while end < n:
+                if sql[end] == c:
+                    # A doubled quote is an escaped quote
+                    if sql.startswith(c * 2, end):
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(sql[i:end + 1])
+            i = end + 1
+            continue
+        if c == "$" and (i == 0 or not (sql[i - 1].isalnum() or sql[i - 1] in "_$")):
+            m = DOLLAR_QUOTE_RE.match(sql, i)
+            if m:
+                end = sql.find(m.group(0), m.end())
+                end = n if end == -1 else end + len(m.group(0))
+                current.append(sql[i:end])
+                i = end
+                continue
+        if c == ";":
+            statements.append("".join(current).strip())
+            current = []
+        else:
+            current.append(c)
+        i += 1
+    statements.append("".join(current).strip())
+    return [s for s in statements if s]
+
+
+def iter_nodes(plan: Dict) -> Iterator[Dict]:
+    """Every node of an EXPLAIN (FORMAT JSON) plan tree, depth first."""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from iter_nodes(child)
+
+
+def has_join_condition(node: Dict) -> bool:
+    """Whether a Nested Loop joins its sides on anything.
+
+    Either the loop has a join filter, or a condition of the inner side
+    refers to a relation of the outer side (a parameterized scan).
+    """
+    if "Join Filter" in node:
+        return True
+    outer, inner = node["Plans"][:2]
+    aliases = {n["Alias"] for n in iter_nodes(outer) if "Alias" in n}
+    return any(
+        f"{alias}." in n[key]
+        for n in iter_nodes(inner)
+        for key in CONDITION_KEYS
+        if key in n
+        for alias in aliases
+    )
+
+
+def plan_stats(plan: Dict) -> Dict:
+    """Plan statistics and flags of one EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) result."""
+    root = plan["Plan"]
+    rows = root.get("Actual Rows", 0)
+    limit = max(BLOWUP_MIN_ROWS, BLOWUP_FACTOR * max(rows, 1))
+    stats = {
+        "rows": rows,
+        "shared_hit": root.get("Shared Hit Blocks", 0),
+        "shared_read": root.get("Shared Read Blocks", 0),
+        "temp_blocks": root.get("Temp Read Blocks", 0) + root.get("Temp Written Blocks", 0),
+        "nodes": 0,
+        "nested_loops": 0,
+        "max_loops": 0,
+        "max_node_rows": 0,
+        "rows_removed": 0,
+        "flags": [],
+    }
+    flags = set()
+    for node in iter_nodes(root):
+        loops = node.get("Actual Loops", 1)
+        node_rows = node.get("Actual Rows", 0) * loops
+        removed = (
+            node.get("Rows Removed by Filter", 0) + node.get("Rows Removed by Join Filter", 0)
+        ) * loops
+        stats["nodes"] += 1
+        stats["max_loops"] = max(stats["max_loops"], loops)
+        stats["max_node_rows"] = max(stats["max_node_rows"], node_rows)
+        stats["rows_removed"] += removed
+        if node["Node Type"] != "Nested Loop":
+            continue
+        stats["nested_loops"] += 1
+        outer, inner = node["Plans"][:2]
+        # A product of single rows is harmless, e.g. two lookups by constant
+        if (
+            outer.get("Actual Rows", 0) > 1
+            and inner.get("Actual Rows", 0) > 1
+            and not has_join_condition(node)
+        ):
+            flags.add("cartesian join")
+        if node_rows > limit or node.get("Rows Removed by Join Filter", 0) * loops > limit:
+            flags.add("nested loop blowup")
+    stats["flags"] = sorted(flags)
+    return stats
+
+
+class QueryProfiler:
+    """Run the agents' result.sql against their seeds and collect plan timings."""
+
+    def __init__(
+        self,
+        output_dir: str = ".output",
+        dsn: str = "",
+        repeats: int = REPEATS,
+        timeout: float = STATEMENT_TIMEOUT,
+        debug: bool = False,
+    ):
+        # psycopg is only needed to run queries
+        import psycopg
+
+        self.psycopg = psycopg
+        self.output_dir = Path(output_dir)
+        self.dsn = dsn
+        self.repeats = repeats
+        self.timeout = timeout
+        self.debug = debug
+        self.results: List[Dict] = []
+        self.templates: Dict[str, str] = {}
+        # Template the scratch database was last copied from
+        self.scratch: Optional[str] = None
+        self.load_time = 0.0
+
+    def seed_template(self, seed_file: Path) -> str:
+        """The template database holding ``seed_file``, loading it if needed."""
+        digest = file_digest(seed_file)
+        template = self.templates.get(digest)
+        if template is not None:
+            return template
+        template = database_name(digest[:16], prefix=PERF_TEMPLATE_PREFIX)
+        start = time.perf_counter()
+        if build_template(self.dsn, template, seed_file, digest):
+            self.load_time += time.perf_counter() - start
+        self.templates[digest] = template
+        return template
+
+    def find_template(self, experiment: str, experiment_dir: Path) -> Optional[str]:
+        """The template of an experiment's seed, or None if it has none."""
+        seed_file = experiment_dir / f"{experiment}.sql"
+        if seed_file.exists():
+            return self.seed_template(seed_file)
+        template = database_name(experiment)
+        if database_exists(self.dsn, template):
+            return template
+        return None
+
+    def explain(self, database: str, query: str) -> List[Dict]:
+        """EXPLAIN ANALYZE the last statement of ``query`` once plus ``repeats`` times.
+
+        Earlier statements run before it in the same transaction. Returns the
+        plans of the timed runs.
+        """
+        from psycopg.conninfo import make_conninfo
+
+        *setup, statement = split_statements(query)
+        plans = []
+        with self.psycopg.connect(make_conninfo(self.dsn, dbname=database)) as conn:
+            for i in range(self.repeats + 1):
+                with conn.transaction(force_rollback=True):
+                    conn.execute(f"SET LOCAL statement_timeout = {int(self.timeout * 1000)}")
+                    for s in setup:
+                        conn.execute(s)
+                    row = conn.execute(
+                        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}"
+                    ).fetchone()
+                plan = row[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                if i > 0:
+                    plans.append(plan[0])
+        return plans
+
+    def profile_experiment(
+        self, seed_id: str, experiment: str, experiment_dir: Path
+    ) -> Optional[Dict]:
+        """Profile a single experiment's result.sql."""
+        result_file = experiment_dir / RESULT_SQL
+        if not result_file.exists():
+            if self.debug:
+                print(f"Missing result file: {result_file}", file=sys.stderr)
+            return None
+
+        row = {name: None for name, _ in PERF_COLUMNS}
+        row.update(
+            run=self.output_dir.name,
+            seed=seed_id,
+            experiment=experiment,
+            split=task_split(experiment),
+            repeats=0,
+            flags=[],
+        )
+        query = result_file.read_text(encoding="utf-8", errors="replace")
+        if not split_statements(query):
+            row["error"] = "empty result.sql"
+            return row
+
+        try:
+            template = self.find_template(experiment, experiment_dir)
+            if template is None:
+                if self.debug:
+                    print(f"No seed for {seed_id}/{experiment}", file=sys.stderr)
+                return None
+            # Templates take no connections, so queries run on a copy. Every
+            # run is rolled back, so the copy is only remade for a new seed.
+            if self.scratch != template:
+                self.scratch = None
+                clone_template(self.dsn, template, SCRATCH_DATABASE)
+                self.scratch = template
+            plans = self.explain(SCRATCH_DATABASE, query)
+        except Exception as e:
+            # Anything one query triggers, e.g. a UnicodeEncodeError on a
+            # SQL_ASCII server, is that experiment's error, not the run's
+            row["error"] = f"{type(e).__name__}: {str(e).strip().splitlines()[0] if str(e).strip() else ''}"
+            return row
+
+        execution = [p["Execution Time"] for p in plans]
+        row.update(
+            repeats=len(plans),
+            planning_ms=statistics.median(p["Planning Time"] for p in plans),
+            execution_ms=statistics.median(execution),
+            execution_min_ms=min(execution),
+            execution_max_ms=max(execution),
+            **plan_stats(plans[-1]),
+        )
+        return row
+
+    def run(self) -> None:
+        """Profile every experiment in the output directory, in seed/experiment order."""
+        if not self.output_dir.exists():
+            print(
+                f"Error: Output directory {self.output_dir} does not exist",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+        try:
+            for seed_dir in sorted(self.output_dir.iterdir()):
+                if not seed_dir.is_dir():
+                    continue
+                for experiment_dir in sorted(seed_dir.iterdir()):
+                    if not experiment_dir.is_dir():
+                        continue
+                    row = self.profile_experiment(seed_dir.name, experiment_dir.name, experiment_dir)
+                    if row:
+                        self.results.append(row)
+        finally:
+            drop_database(self.dsn, SCRATCH_DATABASE)
+
+    def drop_templates(self) -> None:
+        """Drop the seed templates used by this run."""
+        for template in self.templates.values():
+            drop_database(self.dsn, template)
+
+    def summarize(self, top: int = 20) -> List[str]:
+        """Report lines: totals, the slowest queries and every flagged or failed one."""
+        timed = [r for r in self.results if r["error"] is None]
+        failed = [r for r in self.results if r["error"] is not None]
+        flagged = [r for r in timed if r["flags"]]
+
+        def describe(r: Dict) -> str:
+            return (
+                f"{r['seed']}/{r['experiment']}: {r['execution_ms']:.3f} ms "
+                f"(plan {r['planning_ms']:.3f} ms), {r['rows']} rows, "
+                f"{r['shared_hit']} hit / {r['shared_read']} read, "
+                f"{r['nested_loops']} nested loops, max {r['max_node_rows']} rows per node"
+            )
+
+        lines = []
+        lines.append("=" * 80)
+        lines.append("QUERY PERFORMANCE REPORT")
+        lines.append("=" * 80)
+        lines.append("")
+        lines.append(f"Queries: {len(self.results)}")
+        lines.append(f"Timed: {len(timed)} ({self.repeats} runs each, median)")
+        lines.append(f"Failed: {len(failed)}")
+        lines.append(f"Flagged: {len(flagged)}")
+        lines.append(f"Seeds: {len(self.templates)} ({self.load_time:.2f}s loading)")
+        if timed:
+            execution = [r["execution_ms"] for r in timed]
+            lines.append(
+                f"Execution: {statistics.median(execution):.3f} ms median, "
+                f"{max(execution):.3f} ms max, {sum(execution):.3f} ms total"
+            )
+        lines.append("")
+
+        if timed:
+            lines.append("-" * 80)
+            lines.append(f"SLOWEST QUERIES (top {min(top, len(timed))})")
+            lines.append("-" * 80)
+            for r in sorted(timed, key=lambda r: r["execution_ms"], reverse=True)[:top]:
+                lines.append(describe(r))
+            lines.append("")
+
+        if flagged:
+            lines.append("-" * 80)
+            lines.append("FLAGGED PLANS")
+            lines.append("-" * 80)
+            for r in flagged:
+                lines.append(f"{describe(r)} [{', '.join(r['flags'])}]")
+            lines.append("")
+
+        if failed:
+            lines.append("-" * 80)
+            lines.append("FAILED QUERIES")
+            lines.append("-" * 80)
+            for r in failed:
+                lines.append(f"{r['seed']}/{r['experiment']}: {r['error']}")
+            lines.append("")
+        return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay the agents' result.sql under EXPLAIN (ANALYZE, BUFFERS) against their seeds"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=".output",
+        help="Path to the output directory (default: .output)",
+    )
+    parser.add_argument(
+        "--dsn",
+        default="",
+        help="libpq connection string (default: PGHOST, PGUSER, ... from the environment)",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=REPEATS,
+        help=f"Timed runs per query, after one warm-up run (default: {REPEATS})",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=STATEMENT_TIMEOUT,
+        help=f"Seconds before a query is cancelled (default: {STATEMENT_TIMEOUT})",
+    )
+    parser.add_argument(
+        "--top", type=int, default=20, help="Slowest queries listed in the report (default: 20)"
+    )
+    parser.add_argument(
+        "--table",
+        action="append",
+        default=[],
+        help="Also write one row per query to this file, repeatable (.jsonl, .parquet or .arrow)",
+    )
+    parser.add_argument(
+        "--drop-templates",
+        action="store_true",
+        help="Drop the seed templates at the end instead of keeping them for the next run",
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable debug mode with verbose output"
+    )
+
+    args = parser.parse_args()
+    if args.repeats < 1:
+        parser.error("--repeats must be at least 1")
+    for table in args.table:
+        if Path(table).suffix.lower() not in TABLE_FORMATS:
+            parser.error(f"--table {table}: unknown format (expected one of {', '.join(TABLE_FORMATS)})")
+
+    profiler = QueryProfiler(
+        output_dir=args.output_dir,
+        dsn=args.dsn,
+        repeats=args.repeats,
+        timeout=args.timeout,
+        debug=args.debug,
+    )
+    try:
+        profiler.run()
+    finally:
+        if args.drop_templates:
+            profiler.drop_templates()
+
+    print("\n".join(profiler.summarize(top=args.top)))
+
+    for table in args.table:
+        write_rows(profiler.results, table, PERF_COLUMNS)
+        print(f"Perf table written to {table}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Run many tasks concurrently against a pool of warm Postgres databases.
+
+Instead of restarting the Postgres container for every task, this script
+keeps one running Postgres instance with N slot databases. Each task's .sql
+file (written by tasks/init.py) is loaded once into a template database
+tmpl_<task>, or the template is built directly with init.py --backend
+template; before every run its slot is dropped and re-created from that
+template, which takes a fraction of a cold start. Up to N agents run at the same time,
+each with its own slot database and its own agent directory
+.output/{seed}/{task}/, the layout check_results.py and trajectories.py read.
+Tasks of a sharded layout are found recursively and run under their file
+name, without the shard directories.
+
+The agent command is a format string with {agent_dir}, {task}, {seed} and
+{database} placeholders. It runs with PGHOST, PGPORT, PGUSER, PGPASSWORD and
+PGDATABASE pointing at its slot. The default runs the agent image like
+compose.yml does. --stub runs scripts/stub_agent.py instead, to test the
+pipeline locally without Docker or API keys.
+
+Usage:
+    python scripts/run_batch.py [--task Easy_0 ...] [--seeds 3] [--workers 4] [--stub]
+"""
+
+import argparse
+import json
+import os
+import queue
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+TASKS_DIR = REPO_ROOT / "tasks"
+
+# For the tasks package when run as a script
+sys.path.insert(0, str(REPO_ROOT))
+from tasks.templates import (  # noqa: E402
+    build_template,
+    clone_template,
+    database_exists,
+    database_name,
+    drop_database,
+    file_digest,
+)
+
+AGENT_DIR = REPO_ROOT / "agent"
+OUTPUT_DIR = REPO_ROOT / ".output"
+ENV_FILE = REPO_ROOT / ".env"
+
+# Agents (and slot databases) running at the same time
+WORKERS = 4
+# Seconds before an agent run is killed
+AGENT_TIMEOUT = 1800
+
+SLOT_PREFIX = "agent_slot_"
+
+# Per-run records, appended in the output directory
+RUNS_LOG = "runs.jsonl"
+
+AGENT_IMAGE = "swe-agent-postgres-environment:latest"
+DOCKER_AGENT_CMD = (
+    "docker run --rm --add-host=host.docker.internal:host-gateway"
+    " -e PGHOST=host.docker.internal -e PGPORT -e PGUSER -e PGPASSWORD -e PGDATABASE"
+    " -e ANTHROPIC_API_KEY -e MSWEA_MODEL_NAME"
+    f" -v {{agent_dir}}:/agent {AGENT_IMAGE}"
+    " sh -c 'mini-extra config set ANTHROPIC_API_KEY \"$ANTHROPIC_API_KEY\""
+    " && mini-extra config set MSWEA_MODEL_NAME \"$MSWEA_MODEL_NAME\""
+    " && mini-extra config set MSWEA_CONFIGURED true"
+    " && mini --task /agent/TASK.md --cost-limit=1 --output /agent/trajectory.json --yolo --exit-immediately'"
+)
+STUB_AGENT_CMD = f"{shlex.quote(sys.executable)} {shlex.quote(str(Path(__file__).resolve().parent / 'stub_agent.py'))} {{agent_dir}}"
+
+
+def read_env_file(path: Path) -> Dict[str, str]:
+    """Parse KEY=VALUE lines of a .env file, stripping quotes."""
+    env = {}
+    if not path.exists():
+        return env
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        env[key.strip()] = value.strip().strip("\"'")
+    return env
+
+
+def discover_tasks(tasks_dir: Path) -> List[str]:
+    """Names of the generated tasks: every {name}.md with a matching {name}.txt.
+
+    Subdirectories are searched too, for tasks generated with init.py
+    --layout sharded; their names are paths relative to ``tasks_dir``,
+    e.g. ``Easy/0000/Easy_0``.
+    """
+    return sorted(
+        path.relative_to(tasks_dir).with_suffix("").as_posix()
+        for path in tasks_dir.rglob("*.md")
+        if path.with_suffix(".txt").exists()
+    )
+
+
+def run_name(task: str) -> str:
+    """Directory name of a task's runs: its file name without any shard directories."""
+    return Path(task).name
+
+
+class DatabasePool:
+    """Slot databases re-seeded from per-task template databases.
+
+    Templates are built once per .sql file with psql and tagged with the
+    file's hash, so they are only rebuilt when the file changes. Without a
+    .sql file, the template built by init.py --backend template is used as
+    is. ``acquire`` hands out a free slot; ``reset`` re-creates it from a
+    template.
+    """
+
+    def __init__(self, dsn: str = "", slots: int = WORKERS):
+        self.dsn = dsn
+        self.slots = [database_name(str(i), prefix=SLOT_PREFIX) for i in range(slots)]
+        self.free: "queue.Queue[str]" = queue.Queue()
+        for slot in self.slots:
+            self.free.put(slot)
+        self.template_locks: Dict[str, threading.Lock] = {}
+        self.locks_lock = threading.Lock()
+        self.built: Dict[str, str] = {}
+
+    def _template_lock(self, template: str) -> threading.Lock:
+        with self.locks_lock:
+            return self.template_locks.setdefault(template, threading.Lock())
+
+    def template(self, sql_file: Path) -> str:
+        """Return the template database of ``sql_file``, building it if needed."""
+        template = database_name(sql_file.stem)
+        with self._template_lock(template):
+            if template in self.built:
+                return template
+            if sql_file.exists():
+                digest = file_digest(sql_file)
+                build_template(self.dsn, template, sql_file, digest)
+            elif database_exists(self.dsn, template):
+                digest = None
+            else:
+                raise FileNotFoundError(f"{sql_file} not found and no template database {template}")
+            self.built[template] = digest
+            return template
+
+    def reset(self, slot: str, template: str) -> None:
+        """Drop ``slot`` and re-create it as a copy of ``template``."""
+        clone_template(self.dsn, template, slot)
+
+    def acquire(self) -> str:
+        return self.free.get()
+
+    def release(self, slot: str) -> None:
+        self.free.put(slot)
+
+    def drop_slots(self) -> None:
+        """Drop every slot database."""
+        for slot in self.slots:
+            drop_database(self.dsn, slot)
+
+
+class BatchRunner:
+    """Run (seed, task) pairs on a DatabasePool, one agent per slot."""
+
+    def __init__(
+        self,
+        pool: DatabasePool,
+        agent_cmd: str = DOCKER_AGENT_CMD,
+        tasks_dir: Path = TASKS_DIR,
+        output_dir: Path = OUTPUT_DIR,
+        task_db: Optional[str] = None,
+        timeout: float = AGENT_TIMEOUT,
+        resume: bool = False,
+    ):
+        self.pool = pool
+        self.agent_cmd = agent_cmd
+        self.tasks_dir = Path(tasks_dir)
+        self.output_dir = Path(output_dir)
+        self.task_db = task_db
+        self.timeout = timeout
+        self.resume = resume
+        self.env = {**read_env_file(ENV_FILE), **os.environ}
+        self.log_lock = threading.Lock()
+
+    def prepare(self, seed: str, task: str) -> Path:
+        """Create the agent directory: agent config, task files and TASK.md."""
+        agent_dir = self.output_dir / seed / run_name(task)
+        if agent_dir.exists():
+            shutil.rmtree(agent_dir)
+        shutil.copytree(AGENT_DIR, agent_dir)
+        for path in self.tasks_dir.glob(f"{task}.*"):
+            shutil.copy2(path, agent_dir / path.name)
+        shutil.copy2(self.tasks_dir / f"{task}.md", agent_dir / "TASK.md")
+        return agent_dir
+
+    def run_one(self, seed: str, task: str) -> Dict:
+        """Seed a slot for ``task``, run the agent in it and return the run record."""
+        record = {"seed": seed, "task": task}
+        agent_dir = self.output_dir / seed / run_name(task)
+        if self.resume and (agent_dir / "result.txt").exists():
+            return {**record, "status": "skipped"}
+
+        sql_file = self.tasks_dir / f"{self.task_db or task}.sql"
+        slot = self.pool.acquire()
+        try:
+            start = time.perf_counter()
+            template = self.pool.template(sql_file)
+            self.pool.reset(slot, template)
+            reset_time = time.perf_counter() - start
+
+            agent_dir = self.prepare(seed, task)
+            fields = {
+                "agent_dir": agent_dir.resolve(),
+                "task": task,
+                "seed": seed,
+                "database": slot,
+            }
+            cmd = self.agent_cmd.format(**{k: shlex.quote(str(v)) for k, v in fields.items()})
+            env = dict(self.env, PGDATABASE=slot)
+            start = time.perf_counter()
+            with open(agent_dir / "agent.log", "w", encoding="utf-8") as log:
+                try:
+                    returncode = subprocess.run(
+                        shlex.split(cmd),
+                        cwd=agent_dir,
+                        env=env,
+                        stdout=log,
+                        stderr=subprocess.STDOUT,
+                        timeout=self.timeout,
+                    ).returncode
+                    status = "ok" if returncode == 0 else "failed"
+                except subprocess.TimeoutExpired:
+                    returncode = None
+                    status = "timeout"
+            return {
+                **record,
+                "status": status,
+                "returncode": returncode,
+                "database": slot,
+                "reset_time": reset_time,
+                "agent_time": time.perf_counter() - start,
+            }
+        finally:
+            self.pool.release(slot)
+
+    def run(self, seeds: List[str], tasks: List[str], workers: int = WORKERS) -> List[Dict]:
+        """Run every (seed, task) pair, ``workers`` at a time, logging each record."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        records = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self.run_one, seed, task): (seed, task)
+                for seed in seeds
+                for task in tasks
+            }
+            for future in as_completed(futures):
+                seed, task = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = {"seed": seed, "task": task, "status": "error", "error": f"{type(e).__name__}: {e}"}
+                records.append(record)
+                with self.log_lock, open(self.output_dir / RUNS_LOG, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+                print(format_record(record))
+        return records
+
+
+def format_record(record: Dict) -> str:
+    """One-line summary of a run record."""
+    name = f"{record['seed']}/{record['task']}"
+    if record["status"] in ("skipped", "error"):
+        return f"{name}: {record['status']} {record.get('error', '')}".rstrip()
+    return (
+        f"{name}: {record['status']} on {record['database']} "
+        f"(reset {record['reset_time']:.2f}s, agent {record['agent_time']:.1f}s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run many tasks concurrently against a pool of warm Postgres databases"
+    )
+    parser.add_argument(
+        "--task",
+        action="append",
+        help="Task to run, repeatable (default: every task generated in tasks/)",
+    )
+    parser.add_argument(
+        "--seeds", type=int, default=1, help="Runs of every task, saved as seed-000, seed-001, ... (default: 1)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=WORKERS, help=f"Agents and slot databases (default: {WORKERS})"
+    )
+    parser.add_argument(
+        "--dsn",
+        default="",
+        help="Postgres connection string for the admin connection (default: PG* environment variables)",
+    )
+    parser.add_argument(
+        "--task-db",
+        default=None,
+        help="Seed every task from tasks/<TASK_DB>.sql, e.g. a split written with --single-db",
+    )
+    parser.add_argument(
+        "--agent-cmd",
+        default=DOCKER_AGENT_CMD,
+        help="Agent command with {agent_dir}, {task}, {seed} and {database} placeholders (default: the agent container)",
+    )
+    parser.add_argument(
+        "--stub", action="store_true", help="Run scripts/stub_agent.py instead of the agent container"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=AGENT_TIMEOUT, help=f"Seconds per agent run (default: {AGENT_TIMEOUT})"
+    )
+    parser.add_argument(
+        "--output-dir", default=str(OUTPUT_DIR), help="Where runs are saved (default: .output)"
+    )
+    parser.add_argument(
+        "--tasks-dir", default=str(TASKS_DIR), help="Where the generated tasks are (default: tasks/)"
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="Skip runs that already have a result.txt"
+    )
+    parser.add_argument(
+        "--keep-slots", action="store_true", help="Do not drop the slot databases at the end"
+    )
+
+    args = parser.parse_args()
+
+    tasks_dir = Path(args.tasks_dir)
+    tasks = args.task or discover_tasks(tasks_dir)
+    if not tasks:
+        print(f"Error: no tasks found in {tasks_dir}; run tasks/init.py first", file=sys.stderr)
+        sys.exit(1)
+    sql_names = [args.task_db] if args.task_db else tasks
+    missing = [
+        name
+        for name in sql_names
+        if not (tasks_dir / f"{name}.sql").exists()
+        and not database_exists(args.dsn, database_name(run_name(name)))
+    ]
+    if missing:
+        print(
+            f"Error: missing .sql files or template databases for {', '.join(missing)}",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    seeds = [f"seed-{i:03d}" for i in range(args.seeds)]
+    pool = DatabasePool(args.dsn, slots=args.workers)
+    runner = BatchRunner(
+        pool,
+        agent_cmd=STUB_AGENT_CMD if args.stub else args.agent_cmd,
+        tasks_dir=tasks_dir,
+        output_dir=Path(args.output_dir),
+        task_db=args.task_db,
+        timeout=args.timeout,
+        resume=args.resume,
+    )
+
+    print(f"Running {len(seeds) * len(tasks)} runs on {args.workers} slots")
+    start = time.perf_counter()
+    try:
+        records = runner.run(seeds, tasks, workers=args.workers)
+    finally:
+        if not args.keep_slots:
+            pool.drop_slots()
+    failed = [r for r in records if r["status"] not in ("ok", "skipped")]
+    print(
+        f"Finished {len(records)} runs ({len(failed)} not ok) in {time.perf_counter() - start:.1f}s; "
+        f"outputs in {args.output_dir}"
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the agent container, for testing run_batch.py locally.
+
+It checks that the seeded database is reachable, then writes the files a
+real run leaves in its agent directory: result.sql, result.txt (the expected
+answer from the task's .txt file) and a minimal mini-swe-agent
+trajectory.json.
+
+Usage:
+    python scripts/stub_agent.py <agent_dir>
+"""
+
+import csv
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROBE_SQL = (
+    "SELECT count(*) FROM information_schema.tables"
+    " WHERE table_schema NOT IN ('pg_catalog', 'information_schema')"
+)
+
+
+def expected_answer(agent_dir: Path) -> str:
+    """The answer in the task's .txt file (second column of the first data row)."""
+    for path in sorted(agent_dir.glob("*.txt")):
+        if path.name == "result.txt":
+            continue
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            delimiter = "\t" if "\t" in f.read(1024) else ","
+            f.seek(0)
+            reader = csv.reader(f, delimiter=delimiter)
+            next(reader, None)
+            row = next(reader, None)
+            if row and len(row) >= 2:
+                return row[1]
+    return ""
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__, file=sys.stderr)
+        sys.exit(2)
+    agent_dir = Path(sys.argv[1])
+    task = (agent_dir / "TASK.md").read_text(encoding="utf-8")
+
+    start = time.time()
+    probe = subprocess.run(
+        ["psql", "-X", "-At", "-c", PROBE_SQL], capture_output=True, text=True
+    )
+    print(probe.stdout, end="")
+    print(probe.stderr, end="", file=sys.stderr)
+
+    answer = expected_answer(agent_dir)
+    (agent_dir / "result.sql").write_text(PROBE_SQL + ";\n", encoding="utf-8")
+    (agent_dir / "result.txt").write_text(answer + "\n", encoding="utf-8")
+
+    command = f'psql -At -c "{PROBE_SQL}"'
+    trajectory = {
+        "info": {
+            "model_stats": {"instance_cost": 0.0, "api_calls": 1},
+            "exit_status": "Submitted",
+            "submission": "",
+        },
+        "messages": [
+            {"role": "system", "content": "stub agent"},
+            {"role": "user", "content": task},
+            {
+                "role": "assistant",
+                "content": command,
+                "extra": {
+                    "actions": [{"command": command}],
+                    "response": {
+                        "model": "stub",
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0},
+                    },
+                    "cost": 0.0,
+                    "timestamp": start,
+                },
+            },
+            {
+                "role": "tool",
+                "content": probe.stdout,
+                "extra": {
+                    "raw_output": probe.stdout + probe.stderr,
+                    "returncode": probe.returncode,
+                    "timestamp": time.time(),
+                    "exception_info": "",
+                },
+            },
+            {"role": "exit", "content": "", "extra": {"exit_status": "Submitted", "submission": ""}},
+        ],
+        "trajectory_format": "mini-swe-agent-1.1",
+    }
+    with open(agent_dir / "trajectory.json", "w", encoding="utf-8") as f:
+        json.dump(trajectory, f, indent=2)
+
+    sys.exit(probe.returncode)
+
+
+if __name__ == "__main__":
+    main()
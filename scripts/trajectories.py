@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Analyze agent trajectories in the .output directory structure.
+
+This script walks through .output/{seed}/{experiment}/trajectory.json files,
+extracts one row per agent step (token usage, cost, latency, command and
+exit status) and aggregates them into per-experiment totals and percentiles.
+Trajectories are parsed incrementally, one message at a time, so large files
+are never loaded whole.
+
+Step and experiment tables can be written as JSONL, Parquet or Arrow IPC
+(see check_results.py). With --with-results each experiment row also gets the
+match status from ResultChecker.
+
+Usage:
+    python scripts/trajectories.py [--output-dir .output] [--steps steps.parquet]
+                                   [--experiments experiments.jsonl] [--with-results]
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from check_results import TABLE_FORMATS, ResultChecker, task_split, write_rows
+
+# The repository root, for the router's metrics when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from router.metrics import percentile  # noqa: E402
+
+TRAJECTORY_NAME = "trajectory.json"
+
+# Characters read at a time; doubled while a single value does not fit
+CHUNK_SIZE = 64 * 1024
+
+# Characters that can continue a JSON number
+NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+# Message whose prompt tokens are the task prompt: system prompt, user prompt
+# and task input (see "Statistics" in the README)
+TASK_PROMPT_MESSAGE = 4
+
+# Columns of the step and experiment tables and their types
+STEP_COLUMNS = [
+    ("run", "string"),
+    ("seed", "string"),
+    ("experiment", "string"),
+    ("split", "string"),
+    ("step", "int"),
+    ("message", "int"),
+    ("model", "string"),
+    ("timestamp", "float"),
+    ("latency", "float"),
+    ("prompt_tokens", "int"),
+    ("completion_tokens", "int"),
+    ("cache_read_tokens", "int"),
+    ("cache_creation_tokens", "int"),
+    ("cost", "float"),
+    ("command", "string"),
+    ("returncode", "int"),
+    ("exception", "string"),
+]
+
+EXPERIMENT_COLUMNS = [
+    ("run", "string"),
+    ("seed", "string"),
+    ("experiment", "string"),
+    ("split", "string"),
+    ("steps", "int"),
+    ("task_prompt_tokens", "int"),
+    ("prompt_tokens", "int"),
+    ("completion_tokens", "int"),
+    ("cache_read_tokens", "int"),
+    ("cost", "float"),
+    ("failed_commands", "int"),
+    ("wall_time", "float"),
+    ("latency_p50", "float"),
+    ("latency_p95", "float"),
+    ("exit_status", "string"),
+    ("match", "bool"),
+]
+
+# Per-experiment columns summarised across a sweep
+SUMMARY_FIELDS = ("steps", "prompt_tokens", "completion_tokens", "cost", "wall_time")
+
+
+class JSONStream:
+    """Incremental reader of one JSON document.
+
+    Values are decoded one at a time with ``json.JSONDecoder.raw_decode``
+    from a buffer that only holds the unread part of the file.
+    """
+
+    def __init__(self, f, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size: int) -> bool:
+        """Append up to ``size`` characters to the buffer; False at end of file."""
+        if self.eof:
+            return False
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ("" at end of file)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill(self.chunk_size):
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}, found {self.peek()!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete value."""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number may continue in the next chunk
+                number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                if self.eof or not (
+                    number and (end == len(self.buf) or self.buf[end] in NUMBER_CHARS)
+                ):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(size)
+            size *= 2
+
+    def iter_object(self) -> Iterator[str]:
+        """Yield the keys of an object; the caller must consume each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def iter_array(self) -> Iterator[Any]:
+        """Yield the items of an array one at a time."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def iter_trajectory(filepath: Path) -> Iterator[Tuple[str, Any]]:
+    """Yield ``(key, value)`` for the top-level fields of a trajectory file.
+
+    The messages are yielded one by one as ``("message", message)``.
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        stream = JSONStream(f)
+        for key in stream.iter_object():
+            if key == "messages" and stream.peek() == "[":
+                for message in stream.iter_array():
+                    yield "message", message
+            else:
+                yield key, stream.value()
+
+
+def iter_steps(filepath: Path) -> Iterator[Tuple[str, Any]]:
+    """Yield ``("step", row)`` per assistant message, then ``("exit", status)``.
+
+    A step is yielded once the tool results of its commands have been read.
+    """
+    step = None
+    previous_timestamp = None
+    exit_status = None
+    count = 0
+    message_index = -1
+    for key, value in iter_trajectory(filepath):
+        if key == "info":
+            exit_status = exit_status or (value or {}).get("exit_status")
+            continue
+        if key != "message":
+            continue
+        message_index += 1
+        role = value.get("role")
+        extra = value.get("extra") or {}
+
+        if role == "tool":
+            if step is not None:
+                returncode = extra.get("returncode")
+                if returncode is not None and step["returncode"] in (None, 0):
+                    step["returncode"] = returncode
+                if extra.get("exception_info") and not step["exception"]:
+                    step["exception"] = extra["exception_info"]
+            previous_timestamp = extra.get("timestamp", previous_timestamp)
+            continue
+
+        if role == "exit":
+            exit_status = extra.get("exit_status", exit_status)
+            continue
+
+        if role != "assistant":
+            continue
+
+        if step is not None:
+            yield "step", step
+        response = extra.get("response") or {}
+        usage = response.get("usage") or {}
+        timestamp = extra.get("timestamp")
+        step = {
+            "step": count,
+            "message": message_index,
+            "model": response.get("model"),
+            "timestamp": timestamp,
+            "latency": (
+                timestamp - previous_timestamp
+                if timestamp is not None and previous_timestamp is not None
+                else None
+            ),
+            "prompt_tokens": usage.get("prompt_tokens") or 0,
+            "completion_tokens": usage.get("completion_tokens") or 0,
+            "cache_read_tokens": usage.get("cache_read_input_tokens") or 0,
+            "cache_creation_tokens": usage.get("cache_creation_input_tokens") or 0,
+            "cost": extra.get("cost") or 0.0,
+            "command": "\n".join(a.get("command", "") for a in extra.get("actions") or []),
+            "returncode": None,
+            "exception": None,
+        }
+        count += 1
+        previous_timestamp = timestamp if timestamp is not None else previous_timestamp
+
+    if step is not None:
+        yield "step", step
+    yield "exit", exit_status
+
+
+class TrajectoryAnalyzer:
+    """Collect step rows and per-experiment totals from trajectory files."""
+
+    def __init__(self, output_dir: str = ".output", debug: bool = False):
+        self.output_dir = Path(output_dir)
+        self.debug = debug
+        self.steps: List[Dict] = []
+        self.experiments: List[Dict] = []
+
+    def analyze_trajectory(self, seed_id: str, experiment: str, filepath: Path) -> Optional[Dict]:
+        """Add the steps of one trajectory and return its experiment row."""
+        base = {
+            "run": self.output_dir.name,
+            "seed": seed_id,
+            "experiment": experiment,
+            "split": task_split(experiment),
+        }
+        steps = []
+        exit_status = None
+        try:
+            for kind, value in iter_steps(filepath):
+                if kind == "step":
+                    steps.append({**base, **value})
+                else:
+                    exit_status = value
+        except (OSError, ValueError) as e:
+            if self.debug:
+                print(f"Error reading {filepath}: {e}", file=sys.stderr)
+            return None
+
+        self.steps.extend(steps)
+        latencies = [s["latency"] for s in steps if s["latency"] is not None]
+        timestamps = [s["timestamp"] for s in steps if s["timestamp"] is not None]
+        task_prompt = next((s for s in steps if s["message"] == TASK_PROMPT_MESSAGE), None)
+        return {
+            **base,
+            "steps": len(steps),
+            "task_prompt_tokens": task_prompt["prompt_tokens"] if task_prompt else 0,
+            "prompt_tokens": sum(s["prompt_tokens"] for s in steps),
+            "completion_tokens": sum(s["completion_tokens"] for s in steps),
+            "cache_read_tokens": sum(s["cache_read_tokens"] for s in steps),
+            "cost": sum(s["cost"] for s in steps),
+            "failed_commands": sum(1 for s in steps if s["returncode"] not in (None, 0)),
+            "wall_time": timestamps[-1] - timestamps[0] if len(timestamps) > 1 else None,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "exit_status": exit_status,
+            "match": None,
+        }
+
+    def run(self) -> None:
+        """Analyze every trajectory in the output directory."""
+        if not self.output_dir.exists():
+            print(
+                f"Error: Output directory {self.output_dir} does not exist",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+        for seed_dir in sorted(self.output_dir.iterdir()):
+            if not seed_dir.is_dir():
+                continue
+            for experiment_dir in sorted(seed_dir.iterdir()):
+                filepath = experiment_dir / TRAJECTORY_NAME
+                if not filepath.is_file():
+                    if self.debug and experiment_dir.is_dir():
+                        print(f"Missing trajectory: {filepath}", file=sys.stderr)
+                    continue
+                row = self.analyze_trajectory(seed_dir.name, experiment_dir.name, filepath)
+                if row:
+                    self.experiments.append(row)
+
+    def add_results(self, checker: ResultChecker) -> None:
+        """Fill the match column from the results of a ResultChecker run."""
+        matches = {(r["seed_id"], r["experiment"]): r["match"] for r in checker.results}
+        for row in self.experiments:
+            row["match"] = matches.get((row["seed"], row["experiment"]))
+
+    def summarize(self) -> List[str]:
+        """Report lines with totals and per-experiment percentiles across seeds."""
+        lines = []
+        lines.append("=" * 80)
+        lines.append("TRAJECTORY REPORT")
+        lines.append("=" * 80)
+        lines.append("")
+        lines.append(f"Trajectories: {len(self.experiments)}")
+        lines.append(f"Steps: {len(self.steps)}")
+        lines.append(f"Prompt tokens: {sum(r['prompt_tokens'] for r in self.experiments)}")
+        lines.append(f"Completion tokens: {sum(r['completion_tokens'] for r in self.experiments)}")
+        lines.append(f"Cost: ${sum(r['cost'] for r in self.experiments):.4f}")
+        lines.append("")
+
+        groups = defaultdict(list)
+        for row in self.experiments:
+            groups[row["experiment"]].append(row)
+
+        lines.append("-" * 80)
+        lines.append("PER EXPERIMENT (mean / p50 / p95 across seeds)")
+        lines.append("-" * 80)
+        for experiment in sorted(groups):
+            rows = groups[experiment]
+            lines.append(f"{experiment} ({len(rows)} runs)")
+            for field in SUMMARY_FIELDS:
+                values = [r[field] for r in rows if r[field] is not None]
+                if not values:
+                    continue
+                stats = (sum(values) / len(values), percentile(values, 50), percentile(values, 95))
+                spec = ".4f" if field == "cost" else ",.1f"
+                lines.append(f"  {field}: " + " / ".join(format(v, spec) for v in stats))
+            matches = [r["match"] for r in rows if r["match"] is not None]
+            if matches:
+                lines.append(f"  passed: {sum(matches)}/{len(matches)}")
+        return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Analyze agent trajectories in the .output directory structure"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=".output",
+        help="Path to the output directory (default: .output)",
+    )
+    parser.add_argument(
+        "--steps",
+        action="append",
+        default=[],
+        help="Write the step table to this file, repeatable (.jsonl, .parquet or .arrow)",
+    )
+    parser.add_argument(
+        "--experiments",
+        action="append",
+        default=[],
+        help="Write the experiment table to this file, repeatable (.jsonl, .parquet or .arrow)",
+    )
+    parser.add_argument(
+        "--with-results",
+        action="store_true",
+        help="Add the match status of each experiment (runs check_results on the same directory)",
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable debug mode with verbose output"
+    )
+
+    args = parser.parse_args()
+    for table in args.steps + args.experiments:
+        if Path(table).suffix.lower() not in TABLE_FORMATS:
+            parser.error(f"{table}: unknown format (expected one of {', '.join(TABLE_FORMATS)})")
+
+    analyzer = TrajectoryAnalyzer(output_dir=args.output_dir, debug=args.debug)
+    analyzer.run()
+
+    if args.with_results:
+        checker = ResultChecker(output_dir=args.output_dir, debug=args.debug)
+        checker.run_checks()
+        analyzer.add_results(checker)
+
+    print("\n".join(analyzer.summarize()))
+
+    for table in args.steps:
+        write_rows(analyzer.steps, table, STEP_COLUMNS)
+        print(f"Step table written to {table}")
+    for table in args.experiments:
+        write_rows(analyzer.experiments, table, EXPERIMENT_COLUMNS)
+        print(f"Experiment table written to {table}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# Task generation scripts. dataset and templates are also used by router/
+# and scripts/, which import them as tasks.dataset and tasks.templates.
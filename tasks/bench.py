@@ -0,0 +1,406 @@
+# Benchmarks for the task generation pipeline
+
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from dataset import iter_rows
+from init import (
+    DATA_DIR,
+    SQL_MODES,
+    SPLIT_COLUMNS,
+    TaskRenderer,
+    build_sqlite_db_to_file,
+    generate_task,
+    parse_context_to_records,
+)
+from synth import SYNTH_DIR
+
+DATASETS = {
+    "pilot": DATA_DIR.parent / "pilote_Dataset",
+    "full": DATA_DIR.parent / "Test_Dataset_with_Splits",
+    # Written by synth.py
+    "synth": SYNTH_DIR,
+}
+# Benchmarked when --dataset is not given, as far as they exist
+DEFAULT_DATASETS = ("pilot", "full")
+REPEAT = 9
+SIZES = (10, 100, 1000)
+BENCHMARKS = ("parse", "sql", "render", "generate")
+
+# Committed, so a checkout can compare against it; re-save it on the machine that compares
+BASELINE_PATH = Path(__file__).resolve().parent / "bench_baseline.json"
+# Allowed slowdown and memory growth against the baseline, as fractions
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.25
+# Timings shorter than this (in seconds) are too noisy to fail on
+MIN_COMPARED_SECONDS = 0.005
+# Times a slower benchmark is run again before it counts as a regression
+CONFIRM_RUNS = 1
+
+
+def load_rows(dataset_dir):
+    """Read the rows with a context of every split TSV in a dataset directory."""
+    rows = []
+    for path in sorted(dataset_dir.glob("*.tsv")):
+        rows.extend(row for row in iter_rows(path, columns=SPLIT_COLUMNS) if row["Context"])
+    return rows
+
+
+def resize(rows, size):
+    """``size`` rows, repeating ``rows`` as needed."""
+    return list(itertools.islice(itertools.cycle(rows), size))
+
+
+def run_parse(contexts):
+    for context in contexts:
+        parse_context_to_records(context)
+
+
+def run_sql(contexts, out_dir, mode):
+    for i, context in enumerate(contexts):
+        build_sqlite_db_to_file(context=[context], filepath=out_dir / f"task_{i}.sql", mode=mode)
+
+
+def run_render(rows, renderer):
+    for row in rows:
+        renderer.render(question=row["Questions"], schema=None)
+
+
+def run_generate(rows, out_dir, mode):
+    for i, row in enumerate(rows):
+        generate_task(
+            str(out_dir / f"task_{i}"), row["Context"], row["Questions"], row["Answers"], mode=mode
+        )
+
+
+def measure(fn, repeat=REPEAT, memory=True):
+    """Return (median seconds, interquartile range, peak traced bytes of one more run).
+
+    The median and its spread over ``repeat`` runs are steadier than the
+    best run for benchmarks that write files. Memory is traced in its own
+    run, as tracemalloc slows everything down.
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    if len(timings) > 1:
+        low, _, high = statistics.quantiles(timings, n=4)
+        spread = high - low
+    else:
+        spread = 0.0
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return statistics.median(timings), spread, peak
+
+
+def parse_throughput(rows, repeat=REPEAT):
+    """Parse throughput over every context of a dataset, in contexts/second (median of ``repeat`` runs)."""
+    contexts = [row["Context"] for row in rows]
+    seconds, _, _ = measure(lambda: run_parse(contexts), repeat=repeat, memory=False)
+    return len(contexts) / seconds if seconds else float("inf")
+
+
+def run_benchmarks(rows, benchmarks=BENCHMARKS, sizes=SIZES, repeat=REPEAT, mode="insert", dataset="pilot"):
+    """Time every benchmark at every size and return {"dataset/bench/size": result}.
+
+    Parse results also hold the parse throughput in contexts per second.
+    """
+    results = {}
+    renderer = TaskRenderer()
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        out_dir = Path(tmp)
+        for size in sizes:
+            sample = resize(rows, size)
+            contexts = [row["Context"] for row in sample]
+            cases = {
+                "parse": lambda: run_parse(contexts),
+                "sql": lambda: run_sql(contexts, out_dir, mode),
+                "render": lambda: run_render(sample, renderer),
+                "generate": lambda: run_generate(sample, out_dir, mode),
+            }
+            for name in benchmarks:
+                seconds, spread, peak = measure(cases[name], repeat=repeat)
+                key = f"{dataset}/{name}/{size}"
+                results[key] = {
+                    "size": size,
+                    "seconds": seconds,
+                    "iqr": spread,
+                    "per_row_us": seconds / size * 1e6,
+                    "peak_kib": peak / 1024,
+                }
+                if name == "parse":
+                    results[key]["contexts_per_s"] = size / seconds if seconds else None
+                print(format_result(key, results[key]))
+    return results
+
+
+def format_result(key, result, baseline=None):
+    line = (
+        f"{key:<24} {result['seconds'] * 1000:10.2f} ms {result['per_row_us']:10.1f} us/row "
+        f"{result['peak_kib']:10.1f} KiB peak"
+    )
+    if result.get("contexts_per_s"):
+        line += f" {result['contexts_per_s']:12,.0f} contexts/s"
+    if baseline is not None:
+        line += (
+            f"  ({relative(result['seconds'], baseline['seconds']):+.0%} time, "
+            f"{relative(result['peak_kib'], baseline['peak_kib']):+.0%} memory)"
+        )
+    return line
+
+
+def relative(value, reference):
+    return value / reference - 1 if reference else 0.0
+
+
+def environment():
+    """What the timings depend on besides the code."""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_baseline(path, results, meta):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), **meta, "results": results}, f, indent=2)
+
+
+def compare(results, baseline, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """Return {"bench/size": lines} for the benchmarks slower or bigger than the baseline allows.
+
+    Timings count as slower when the current run is slower by more than the
+    tolerance even after allowing for the run-to-run spread of both: half an
+    interquartile range is taken off the current median and added to the
+    baseline one.
+    """
+    regressions = {}
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        lines = []
+        # Baselines saved before the spread was recorded have no "iqr"
+        low = result["seconds"] - result.get("iqr", 0.0) / 2
+        high = reference["seconds"] + reference.get("iqr", 0.0) / 2
+        slower = relative(low, high)
+        bigger = relative(result["peak_kib"], reference["peak_kib"])
+        if slower > time_tolerance and reference["seconds"] >= MIN_COMPARED_SECONDS:
+            lines.append(
+                f"{key}: {relative(result['seconds'], reference['seconds']):+.0%} time, "
+                f"{slower:+.0%} beyond the spread (tolerance {time_tolerance:.0%})"
+            )
+        if bigger > memory_tolerance:
+            lines.append(f"{key}: {bigger:+.0%} memory (tolerance {memory_tolerance:.0%})")
+        if lines:
+            regressions[key] = lines
+    return regressions
+
+
+def confirm(
+    dataset_rows,
+    regressions,
+    baseline,
+    runs=CONFIRM_RUNS,
+    repeat=REPEAT,
+    mode="insert",
+    time_tolerance=TIME_TOLERANCE,
+    memory_tolerance=MEMORY_TOLERANCE,
+):
+    """Run the regressed benchmarks ``runs`` more times and keep those that regress every time.
+
+    ``dataset_rows`` maps dataset names to their rows.
+    """
+    for _ in range(runs):
+        if not regressions:
+            break
+        print()
+        print(f"Running {len(regressions)} slower benchmark(s) again:")
+        rerun = {}
+        for key in regressions:
+            dataset, name, size = key.split("/")
+            rerun.update(
+                run_benchmarks(
+                    dataset_rows[dataset],
+                    benchmarks=(name,),
+                    sizes=(int(size),),
+                    repeat=repeat,
+                    mode=mode,
+                    dataset=dataset,
+                )
+            )
+        again = compare(rerun, baseline, time_tolerance, memory_tolerance)
+        regressions = {key: again[key] for key in regressions if key in again}
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark context parsing, SQL emission, TASK.md rendering and end-to-end task generation"
+    )
+    parser.add_argument(
+        "--dataset",
+        choices=sorted(DATASETS),
+        action="append",
+        help=f"Dataset whose rows are benchmarked, repeatable (default: {', '.join(DEFAULT_DATASETS)}, those that exist)",
+    )
+    parser.add_argument(
+        "--bench",
+        choices=BENCHMARKS,
+        action="append",
+        help=f"Benchmark to run, repeatable (default: {', '.join(BENCHMARKS)})",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=list(SIZES),
+        help=f"Rows per run, rows are repeated when the dataset is smaller (default: {' '.join(map(str, SIZES))})",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=REPEAT, help=f"Timed runs per benchmark, the median is kept (default: {REPEAT})"
+    )
+    parser.add_argument(
+        "--sql-mode",
+        choices=SQL_MODES,
+        default="insert",
+        help="SQL mode of the sql and generate benchmarks (default: insert)",
+    )
+    parser.add_argument(
+        "--save",
+        nargs="?",
+        const=BASELINE_PATH,
+        default=None,
+        help=f"Store the results as the baseline (default path: {BASELINE_PATH})",
+    )
+    parser.add_argument(
+        "--compare",
+        nargs="?",
+        const=BASELINE_PATH,
+        default=None,
+        help=f"Compare with a stored baseline and exit with 1 on regressions (default path: {BASELINE_PATH})",
+    )
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        default=TIME_TOLERANCE,
+        help=f"Allowed slowdown against the baseline (default: {TIME_TOLERANCE})",
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=MEMORY_TOLERANCE,
+        help=f"Allowed peak memory growth against the baseline (default: {MEMORY_TOLERANCE})",
+    )
+    parser.add_argument(
+        "--confirm",
+        type=int,
+        default=CONFIRM_RUNS,
+        help=f"Re-runs a slower benchmark must fail too before it counts as a regression (default: {CONFIRM_RUNS})",
+    )
+    args = parser.parse_args()
+
+    dataset_rows = {}
+    for name in args.dataset or DEFAULT_DATASETS:
+        dataset_dir = DATASETS[name]
+        if not dataset_dir.exists():
+            if args.dataset:
+                sys.exit(f"{dataset_dir} not found")
+            print(f"Skipping {name}: {dataset_dir} not found")
+            continue
+        rows = load_rows(dataset_dir)
+        if not rows:
+            sys.exit(f"No rows with a context in {dataset_dir}")
+        dataset_rows[name] = rows
+    if not dataset_rows:
+        sys.exit("No dataset to benchmark")
+
+    baseline = None
+    if args.compare:
+        if not Path(args.compare).exists():
+            parser.error(f"no baseline at {args.compare}, store one with --save")
+        with open(args.compare, encoding="utf-8") as f:
+            stored = json.load(f)
+        baseline = stored["results"]
+        if stored.get("environment") != environment():
+            print(f"Warning: baseline recorded on {stored.get('environment')}, now {environment()}")
+
+    results = {}
+    for name, rows in dataset_rows.items():
+        print(f"{name}: {len(rows)} rows, sizes {args.sizes}, median of {args.repeat}")
+        results.update(
+            run_benchmarks(
+                rows,
+                benchmarks=args.bench or BENCHMARKS,
+                sizes=args.sizes,
+                repeat=args.repeat,
+                mode=args.sql_mode,
+                dataset=name,
+            )
+        )
+        if "parse" in (args.bench or BENCHMARKS):
+            rate = parse_throughput(rows, repeat=args.repeat)
+            print(f"{name}: parsed {len(rows)} contexts at {rate:,.0f} contexts/s")
+
+    if args.save:
+        save_baseline(
+            args.save,
+            results,
+            {
+                "datasets": list(dataset_rows),
+                "sizes": args.sizes,
+                "sql_mode": args.sql_mode,
+                "repeat": args.repeat,
+            },
+        )
+        print(f"Baseline written to {args.save}")
+
+    if baseline is not None:
+        print()
+        print("Against the baseline:")
+        for key, result in results.items():
+            if key in baseline:
+                print(format_result(key, result, baseline[key]))
+        regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+        regressions = confirm(
+            dataset_rows,
+            regressions,
+            baseline,
+            runs=args.confirm,
+            repeat=args.repeat,
+            mode=args.sql_mode,
+            time_tolerance=args.time_tolerance,
+            memory_tolerance=args.memory_tolerance,
+        )
+        if regressions:
+            lines = [line for key_lines in regressions.values() for line in key_lines]
+            print()
+            print(f"{len(lines)} regression(s):")
+            for line in lines:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions")
@@ -0,0 +1,154 @@
+# Streaming readers for the dataset TSV splits, shared by the task generator and the router
+
+import csv
+import hashlib
+import random
+import sys
+from array import array
+from io import StringIO
+from pathlib import Path
+
+# Contexts can be longer than the csv module's default field limit
+csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+
+INDEX_CACHE_DIR = Path(__file__).resolve().parent / ".cache"
+# Bumped when the offsets of a cached RowIndex would differ
+INDEX_VERSION = 2
+
+
+def _projection(header, columns, path):
+    """Return the positions of ``columns`` in ``header`` (all columns if None)."""
+    if columns is None:
+        return list(header), list(range(len(header)))
+    missing = [c for c in columns if c not in header]
+    if missing:
+        raise KeyError(f"{path}: missing columns {missing}")
+    return list(columns), [header.index(c) for c in columns]
+
+
+def iter_rows(path, columns=None):
+    """Yield the rows of a TSV file as dicts, keeping only ``columns``.
+
+    Rows are parsed one at a time, so memory does not grow with the file.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, delimiter="\t")
+        header = next(reader, None)
+        if header is None:
+            return
+        names, positions = _projection(header, columns, path)
+        for row in reader:
+            if not row:
+                continue
+            yield {name: row[i] if i < len(row) else "" for name, i in zip(names, positions)}
+
+
+def reservoir_sample(items, k, seed=0):
+    """Pick ``k`` items uniformly at random in one pass with O(k) memory.
+
+    Returns ``(sample, seen)``: the picked items in their original order and
+    the number of items read. A ``k`` of None or <= 0 keeps every item. The
+    picks only depend on the item positions and the seed.
+    """
+    if k is None or k <= 0:
+        sample = list(items)
+        return sample, len(sample)
+    rng = random.Random(seed)
+    reservoir = []
+    seen = 0
+    for item in items:
+        if seen < k:
+            reservoir.append((seen, item))
+        else:
+            j = rng.randrange(seen + 1)
+            if j < k:
+                reservoir[j] = (seen, item)
+        seen += 1
+    reservoir.sort(key=lambda entry: entry[0])
+    return [item for _, item in reservoir], seen
+
+
+class RowIndex:
+    """Byte offsets of every data row in a TSV file, for random access.
+
+    The offsets are cached in ``cache_dir`` and rebuilt when the file's size
+    or modification time changes. Records are split by the same csv reader
+    as iter_rows, so both see the same rows, quoted fields spanning lines
+    included.
+    """
+
+    def __init__(self, path, cache_dir=INDEX_CACHE_DIR):
+        self.path = Path(path)
+        stat = self.path.stat()
+        self.stamp = (stat.st_size, stat.st_mtime_ns)
+        digest = hashlib.sha1(str(self.path.resolve()).encode("utf-8")).hexdigest()
+        self.cache_path = Path(cache_dir) / f"{self.path.stem}-{digest[:12]}.idx"
+        self.offsets = self._load() or self._build()
+        with open(self.path, "r", encoding="utf-8", newline="") as f:
+            self.header = next(csv.reader(f, delimiter="\t"), [])
+
+    def _load(self):
+        """Read cached offsets, or return None if missing or stale."""
+        if not self.cache_path.exists():
+            return None
+        offsets = array("Q")
+        with open(self.cache_path, "rb") as f:
+            offsets.frombytes(f.read())
+        if len(offsets) < 4 or tuple(offsets[:3]) != (INDEX_VERSION, *self.stamp):
+            return None
+        return offsets[3:]
+
+    def _build(self):
+        """Scan the file once for record boundaries and cache the offsets."""
+        offsets = array("Q")
+        position = 0
+
+        def lines(f):
+            # With newline="" lines are not translated, so their encoded
+            # length is their length in the file
+            nonlocal position
+            for line in f:
+                position += len(line.encode("utf-8"))
+                yield line
+
+        with open(self.path, "r", encoding="utf-8", newline="") as f:
+            # The reader only pulls the lines of the record it returns
+            reader = csv.reader(lines(f), delimiter="\t")
+            start = 0
+            for i, row in enumerate(reader):
+                if i > 0 and row:
+                    offsets.append(start)
+                start = position
+        offsets.append(position)
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_path, "wb") as f:
+            array("Q", (INDEX_VERSION, *self.stamp)).tofile(f)
+            offsets.tofile(f)
+        return offsets
+
+    def __len__(self):
+        # The last offset marks the end of the file
+        return len(self.offsets) - 1
+
+    def read(self, i, columns=None):
+        """Parse data row ``i`` as a dict, keeping only ``columns``."""
+        start = self.offsets[i]
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            raw = f.read(self.offsets[i + 1] - start)
+        row = next(csv.reader(StringIO(raw.decode("utf-8"), newline=""), delimiter="\t"))
+        names, positions = _projection(self.header, columns, self.path)
+        return {name: row[p] if p < len(row) else "" for name, p in zip(names, positions)}
+
+
+def sample_rows(path, k, seed=0, columns=None, index=False):
+    """Reservoir-sample ``k`` rows of a TSV file, returning ``(rows, total_rows)``.
+
+    Without ``index`` the file is streamed once. With ``index`` the cached
+    RowIndex picks the same rows by position and only those rows are parsed.
+    """
+    if not index:
+        return reservoir_sample(iter_rows(path, columns), k, seed)
+    row_index = RowIndex(path)
+    picks, total = reservoir_sample(range(len(row_index)), k, seed)
+    return [row_index.read(i, columns) for i in picks], total
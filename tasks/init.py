@@ -1,48 +1,189 @@
 # SQL helpers (schema-based methods)
 
 import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.util import Finalize
+import datetime
+import decimal
+from functools import lru_cache, partial
+import hashlib
+import json
+import math
+import numbers
+import os
 from pathlib import Path
 import re
-from jinja2 import Template
+import shutil
+import time
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
-import pandas as pd
+from dataset import sample_rows
+from templates import create_database, database_name, drop_database, mark_template
+
+
+INSERT_RE = re.compile(
+    r"^\s*INSERT\s+INTO\s+(\w+)\s*\(([^)]*)\)\s*VALUES\s*\(", re.IGNORECASE
+)
+
+SQL_MODES = ("insert", "values", "copy")
+BATCH_SIZE = 1000
+
+
+# A quoted literal or identifier (skipped), or a ? placeholder
+PLACEHOLDER_RE = re.compile(r"'[^']*'|\"[^\"]*\"|\?")
+
+
+def _format_param(param):
+    """Format a parameter as a SQL literal."""
+    if param is None:
+        return "NULL"
+    if isinstance(param, str):
+        return "'" + param.replace("'", "''") + "'"
+    if isinstance(param, bool):
+        return "TRUE" if param else "FALSE"
+    if isinstance(param, numbers.Integral):
+        return str(int(param))
+    if isinstance(param, numbers.Real):
+        value = float(param)
+        if math.isnan(value):
+            return "'NaN'::float8"
+        if math.isinf(value):
+            return "'Infinity'::float8" if value > 0 else "'-Infinity'::float8"
+        return repr(value)
+    if isinstance(param, decimal.Decimal):
+        return f"'{param}'::numeric"
+    if isinstance(param, (datetime.date, datetime.time)):
+        return f"'{param.isoformat()}'"
+    if isinstance(param, (bytes, bytearray, memoryview)):
+        return f"'\\x{bytes(param).hex()}'::bytea"
+    raise TypeError(f"Unsupported SQL parameter type: {type(param).__name__}")
+
+
+def _format_copy_param(param):
+    """Format a parameter as a COPY text-format field."""
+    if param is None:
+        return "\\N"
+    if isinstance(param, bool):
+        return "t" if param else "f"
+    if isinstance(param, numbers.Real) and not isinstance(param, numbers.Integral):
+        value = float(param)
+        if math.isinf(value):
+            return "Infinity" if value > 0 else "-Infinity"
+        return "NaN" if math.isnan(value) else repr(value)
+    if isinstance(param, (datetime.date, datetime.time)):
+        return param.isoformat()
+    if isinstance(param, (bytes, bytearray, memoryview)):
+        # The bytea hex prefix needs its backslash escaped in COPY text
+        return "\\\\x" + bytes(param).hex()
+    return (
+        str(param)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+@lru_cache(maxsize=256)
+def _split_placeholders(sql):
+    """Split ``sql`` around its ``?`` placeholders, ignoring those inside quotes."""
+    chunks = []
+    start = 0
+    for m in PLACEHOLDER_RE.finditer(sql):
+        if m.group() == "?":
+            chunks.append(sql[start : m.start()])
+            start = m.end()
+    chunks.append(sql[start:])
+    return tuple(chunks)
+
+
+def bind_params(sql, params):
+    """Substitute ``params`` for the ``?`` placeholders of ``sql`` as SQL literals."""
+    chunks = _split_placeholders(sql)
+    if len(chunks) - 1 != len(params):
+        raise ValueError(
+            f"Expected {len(chunks) - 1} parameters, got {len(params)}: {sql!r}"
+        )
+    parts = [chunks[0]]
+    for param, chunk in zip(params, chunks[1:]):
+        parts.append(_format_param(param))
+        parts.append(chunk)
+    return "".join(parts)
 
 
 class SQLFileWriter:
-    """Simple cursor replacement that writes SQL to a file instead of executing it."""
+    """Simple cursor replacement that writes SQL to a file instead of executing it.
+
+    In ``insert`` mode every ``execute`` call becomes one statement. In
+    ``values`` and ``copy`` modes, parameterized ``INSERT INTO t (...) VALUES``
+    statements are buffered per table and emitted as multi-row ``VALUES``
+    lists or ``COPY ... FROM stdin`` blocks of up to ``batch_size`` rows.
+    Buffers are flushed before any other statement, so statement order is
+    preserved.
+    """
 
-    def __init__(self, filepath):
+    def __init__(self, filepath, mode="insert", batch_size=BATCH_SIZE):
+        if mode not in SQL_MODES:
+            raise ValueError(f"Unknown SQL mode: {mode!r} (expected one of {SQL_MODES})")
         self.filepath = filepath
+        self.mode = mode
+        self.batch_size = batch_size
+        self.buffers = {}
         self.file = open(filepath, "w")
 
     def execute(self, sql, params=None):
         """Write SQL to file, replacing parameters if provided."""
+        if params and self.mode != "insert":
+            m = INSERT_RE.match(sql)
+            if m:
+                table = m.group(1)
+                columns = tuple(c.strip() for c in m.group(2).split(","))
+                self._buffer(table, columns, params)
+                return
+
+        self.flush()
+
         if params:
             # Replace ? placeholders with actual values
-            if isinstance(params, tuple):
-                for param in params:
-                    # Format the parameter appropriately
-                    if param is None:
-                        formatted = "NULL"
-                    elif isinstance(param, str):
-                        formatted = f"'{param.replace("'", "''")}'"
-                    elif isinstance(param, int):
-                        formatted = str(param)
-                    else:
-                        formatted = str(param)
-                    sql = sql.replace("?", formatted, 1)
-            elif isinstance(params, list):
-                for param in params:
-                    if param is None:
-                        formatted = "NULL"
-                    elif isinstance(param, str):
-                        formatted = f"'{param.replace("'", "''")}'"
-                    elif isinstance(param, int):
-                        formatted = str(param)
-                    else:
-                        formatted = str(param)
-                    sql = sql.replace("?", formatted, 1)
+            sql = bind_params(sql, params)
+
+        self._write_statement(sql)
+
+    def _buffer(self, table, columns, params):
+        """Queue one row for a batched insert into ``table``."""
+        key = (table, columns)
+        if self.mode == "copy":
+            row = "\t".join(_format_copy_param(p) for p in params)
+        else:
+            row = "(" + ", ".join(_format_param(p) for p in params) + ")"
+        rows = self.buffers.setdefault(key, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self._flush_table(key)
+
+    def _flush_table(self, key):
+        """Emit the buffered rows for one table."""
+        rows = self.buffers.pop(key, None)
+        if not rows:
+            return
+        table, columns = key
+        column_list = ", ".join(columns)
+        if self.mode == "copy":
+            self.file.write(f"COPY {table} ({column_list}) FROM stdin;\n")
+            self.file.write("\n".join(rows))
+            self.file.write("\n\\.\n")
+        else:
+            self.file.write(f"INSERT INTO {table} ({column_list}) VALUES\n")
+            self.file.write(",\n".join(rows))
+            self.file.write(";\n")
 
+    def flush(self):
+        """Emit all buffered rows, in the order their tables were first seen."""
+        for key in list(self.buffers):
+            self._flush_table(key)
+
+    def _write_statement(self, sql):
         # Write the SQL to file with a semicolon
         self.file.write(sql.strip())
         if not sql.strip().endswith(";"):
@@ -50,8 +191,9 @@ class SQLFileWriter:
         self.file.write("\n")
 
     def close(self):
-        """Close the file."""
-        if hasattr(self, "file"):
+        """Flush pending rows and close the file."""
+        if hasattr(self, "file") and not self.file.closed:
+            self.flush()
             self.file.close()
 
     def __enter__(self):
@@ -61,89 +203,232 @@ class SQLFileWriter:
         self.close()
 
 
-def parse_birth_date(lines):
-    for i, line in enumerate(lines):
-        if line.strip().lower() == "birth date":
-            for j in range(i + 1, len(lines)):
-                candidate = lines[j].strip()
-                if not candidate:
-                    continue
-                m = re.search(r"(\d{4})-(\d{1,2})-(\d{1,2})", candidate)
-                if m:
-                    y, mo, d = map(int, m.groups())
-                    return y, mo, d
-                m = re.search(r"(\d{4})", candidate)
-                if m:
-                    return int(m.group(1)), None, None
-    return None, None, None
+# Connection pools for build_postgres_db, one single-connection pool per DSN
+_pools = {}
 
 
-def parse_context_to_records(context):
-    lines = [l.strip() for l in context.splitlines()]
-    name = ""
-    for line in lines:
-        if line:
-            name = line
-            break
+def get_pool(dsn=""):
+    """Return the shared single-connection pool for ``dsn``, opening it on first use."""
+    pool = _pools.get(dsn)
+    if pool is None:
+        from psycopg_pool import ConnectionPool
+
+        pool = ConnectionPool(dsn, min_size=1, max_size=1, open=True)
+        _pools[dsn] = pool
+    return pool
+
+
+def close_pool(dsn=""):
+    """Close the pool opened by get_pool for ``dsn``, if any."""
+    pool = _pools.pop(dsn, None)
+    if pool is not None:
+        pool.close()
+
+
+def close_pools():
+    """Close every pool opened by get_pool."""
+    while _pools:
+        _, pool = _pools.popitem()
+        pool.close()
+
+
+class PostgresCopyWriter:
+    """Cursor replacement that loads rows into Postgres with binary COPY.
+
+    Parameterized ``INSERT INTO t (...) VALUES`` statements are buffered per
+    table and sent as ``COPY ... FROM STDIN (FORMAT BINARY)`` batches of up to
+    ``batch_size`` rows. Any other statement flushes the buffers and is
+    executed as is.
+    """
+
+    def __init__(self, conn, batch_size=BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.column_types = {}
+
+    def execute(self, sql, params=None):
+        """Buffer INSERT rows for COPY, execute anything else directly."""
+        if params:
+            m = INSERT_RE.match(sql)
+            if m:
+                table = m.group(1)
+                columns = tuple(c.strip() for c in m.group(2).split(","))
+                rows = self.buffers.setdefault((table, columns), [])
+                rows.append(params)
+                if len(rows) >= self.batch_size:
+                    self._flush_table((table, columns))
+                return
+            raise ValueError(f"Only INSERT statements take parameters: {sql!r}")
+
+        self.flush()
+        self.conn.execute(sql)
+
+    def _types(self, table, columns):
+        """Look up the type OIDs of ``columns``, as binary COPY needs exact types."""
+        key = (table, columns)
+        if key not in self.column_types:
+            rows = self.conn.execute(
+                "SELECT a.atttypid FROM unnest(%s::text[]) WITH ORDINALITY AS c(name, n)"
+                " JOIN pg_attribute a ON a.attrelid = %s::regclass AND a.attname = lower(c.name)"
+                " ORDER BY c.n",
+                (list(columns), table),
+            ).fetchall()
+            if len(rows) != len(columns):
+                raise ValueError(f"Unknown columns for {table}: {columns}")
+            self.column_types[key] = [oid for (oid,) in rows]
+        return self.column_types[key]
+
+    def _flush_table(self, key):
+        """COPY the buffered rows for one table."""
+        rows = self.buffers.pop(key, None)
+        if not rows:
+            return
+        table, columns = key
+        types = self._types(table, columns)
+        with self.conn.cursor() as cur:
+            with cur.copy(
+                f"COPY {table} ({', '.join(columns)}) FROM STDIN (FORMAT BINARY)"
+            ) as copy:
+                copy.set_types(types)
+                for row in rows:
+                    copy.write_row(row)
+
+    def flush(self):
+        """COPY all buffered rows, in the order their tables were first seen."""
+        for key in list(self.buffers):
+            self._flush_table(key)
+
+    def close(self):
+        """Flush pending rows. The connection is owned by the caller."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+
+
+DATE_RE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+YEAR_RE = re.compile(r"(\d{4})")
+FORMAT_SPLIT_RE = re.compile(r"\t|\s{2,}")
+MEDAL_WORD_RE = re.compile(r"\bMedal")
+MEDAL_ENTRY_RE = re.compile(r"(Medal\w+)\s*\|\s*(\d{4})\s*\|\s*(.+)")
+
+MedalRow = namedtuple("MedalRow", "tournament format type year location")
+AthleteRecord = namedtuple("AthleteRecord", "name birth medals")
 
-    birth_year, birth_month, birth_day = parse_birth_date(lines)
 
+def parse_context_to_records(context):
+    """Parse an athlete context into an AthleteRecord in a single pass.
+
+    The name is the first non-empty line. The birth date is the first date
+    (or bare year) found after a "Birth date" line. Medal lines are only read
+    after "Country representing"; any other line there starts a tournament.
+    """
+    name = ""
+    birth = None
+    seeking_birth = False
     in_tournament = False
     current_tournament = None
-    medal_rows = []
+    medals = []
 
-    for line in lines:
+    for line in context.splitlines():
+        line = line.strip()
         if not line:
             continue
+        if not name:
+            name = line
+
+        if birth is None:
+            if seeking_birth:
+                m = DATE_RE.search(line)
+                if m:
+                    birth = (int(m.group(1)), int(m.group(2)), int(m.group(3)))
+                else:
+                    m = YEAR_RE.search(line)
+                    if m:
+                        birth = (int(m.group(1)), None, None)
+            elif line.lower() == "birth date":
+                seeking_birth = True
+
         if line.lower().startswith("country representing"):
             in_tournament = True
             continue
         if not in_tournament:
             continue
 
-        if "Medal" in line:
-            if not current_tournament:
+        if "Medal" not in line:
+            current_tournament = line
+            continue
+        if current_tournament is None:
+            continue
+
+        parts = FORMAT_SPLIT_RE.split(line, maxsplit=1)
+        if len(parts) == 1:
+            m = MEDAL_WORD_RE.search(line)
+            if not m:
                 continue
-            parts = re.split(r"\t|\s{2,}", line, maxsplit=1)
-            if len(parts) == 1:
-                m = re.search(r"\bMedal", line)
-                if not m:
-                    continue
-                format_name = line[: m.start()].strip()
-                medals_text = line[m.start() :].strip()
-            else:
-                format_name = parts[0].strip()
-                medals_text = parts[1].strip()
-
-            for entry in medals_text.split(","):
-                entry = entry.strip()
-                m = re.match(r"(Medal\w+)\s*\|\s*(\d{4})\s*\|\s*(.+)", entry)
-                if not m:
-                    continue
-                medal_type, year, location = m.groups()
-                medal_rows.append(
-                    {
-                        "tournament": current_tournament,
-                        "format": format_name,
-                        "type": medal_type,
-                        "year": int(year),
-                        "location": location.strip(),
-                    }
-                )
+            format_name = line[: m.start()].strip()
+            medals_text = line[m.start() :]
         else:
-            current_tournament = line
+            format_name = parts[0].strip()
+            medals_text = parts[1]
+
+        for entry in medals_text.split(","):
+            m = MEDAL_ENTRY_RE.match(entry.strip())
+            if m:
+                medals.append(
+                    MedalRow(
+                        current_tournament,
+                        format_name,
+                        m.group(1),
+                        int(m.group(2)),
+                        m.group(3).strip(),
+                    )
+                )
 
-    return name, (birth_year, birth_month, birth_day), medal_rows
+    return AthleteRecord(name, birth or (None, None, None), medals)
+
+
+TABLES = ("Athlete", "Tournament", "Format", "Medal", "PersonalInformation")
+
+# Foreign keys and indexes on the join and filter columns, applied after the
+# data load so the bulk insert does not maintain them row by row
+INDEX_DDL = (
+    "ALTER TABLE Tournament ADD FOREIGN KEY (athlete_id) REFERENCES Athlete (athlete_id)",
+    "ALTER TABLE Format ADD FOREIGN KEY (tournament_id) REFERENCES Tournament (tournament_id)",
+    "ALTER TABLE Medal ADD FOREIGN KEY (format_id) REFERENCES Format (format_id)",
+    "ALTER TABLE PersonalInformation ADD FOREIGN KEY (athlete_id) REFERENCES Athlete (athlete_id)",
+    "CREATE INDEX ON Tournament (athlete_id)",
+    "CREATE INDEX ON Format (tournament_id)",
+    "CREATE INDEX ON Medal (format_id)",
+    "CREATE INDEX ON Medal (year)",
+    "CREATE INDEX ON Medal (type)",
+    "CREATE INDEX ON PersonalInformation (athlete_id)",
+    f"ANALYZE {', '.join(TABLES)}",
+)
 
 
-def build_sqlite_db_to_file(context, filepath):
-    """
-    Build SQL statements and write them to a file instead of executing them.
-    This is a drop-in replacement for build_sqlite_db that writes SQL to a file.
-    """
+def schema_name(n):
+    """Name of the Postgres schema holding task number ``n`` in a shared database."""
+    return f"task_{n:04d}"
 
-    # Use SQLFileWriter instead of actual database cursor
-    cur = SQLFileWriter(filepath)
+
+def build_db(context, cur, schema=None, indexes=False):
+    """Create the athletics tables and insert the parsed context rows through ``cur``.
+
+    ``cur`` is anything with a DB-API style ``execute(sql, params)`` that
+    understands ``?`` placeholders, such as SQLFileWriter or PostgresCopyWriter.
+    With ``schema`` the tables are created in that (new) schema, which is left
+    on the search_path, so several tasks can share one database. With
+    ``indexes`` the INDEX_DDL statements run once all rows are loaded.
+    """
+    if schema:
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"SET search_path TO {schema}")
 
     cur.execute(
         "CREATE TABLE Athlete (athlete_id INTEGER PRIMARY KEY, name TEXT NOT NULL)"
@@ -180,7 +465,7 @@ def build_sqlite_db_to_file(context, filepath):
         )
 
         for row in medal_rows:
-            t_name = row["tournament"]
+            t_name = row.tournament
             if t_name not in tournament_ids:
                 tournament_ids[t_name] = next_tournament_id
                 cur.execute(
@@ -190,28 +475,87 @@ def build_sqlite_db_to_file(context, filepath):
                 next_tournament_id += 1
 
             t_id = tournament_ids[t_name]
-            f_key = (t_id, row["format"])
+            f_key = (t_id, row.format)
             if f_key not in format_ids:
                 format_ids[f_key] = next_format_id
                 cur.execute(
                     "INSERT INTO Format (format_id, tournament_id, name) VALUES (?, ?, ?)",
-                    (next_format_id, t_id, row["format"]),
+                    (next_format_id, t_id, row.format),
                 )
                 next_format_id += 1
 
             f_id = format_ids[f_key]
             cur.execute(
                 "INSERT INTO Medal (medal_id, format_id, type, year, location) VALUES (?, ?, ?, ?, ?)",
-                (next_medal_id, f_id, row["type"], row["year"], row["location"]),
+                (next_medal_id, f_id, row.type, row.year, row.location),
             )
             next_medal_id += 1
 
         athlete_id += 1
 
-    cur.close()
+    if indexes:
+        for sql in INDEX_DDL:
+            cur.execute(sql)
+
+
+def build_sqlite_db_to_file(
+    context, filepath, mode="insert", batch_size=BATCH_SIZE, schema=None, indexes=False
+):
+    """
+    Build SQL statements and write them to a file instead of executing them.
+    This is a drop-in replacement for build_sqlite_db that writes SQL to a file.
+    ``mode`` selects how rows are emitted (see SQLFileWriter).
+    """
+
+    # Use SQLFileWriter instead of actual database cursor
+    with SQLFileWriter(filepath, mode=mode, batch_size=batch_size) as cur:
+        build_db(context, cur, schema=schema, indexes=indexes)
     return filepath
 
 
+def build_postgres_db(
+    context, dsn="", batch_size=BATCH_SIZE, reset=True, schema=None, indexes=False
+):
+    """
+    Load the context straight into a live Postgres database with binary COPY.
+    ``dsn`` is a libpq connection string; an empty one uses the PG* environment
+    variables. With ``reset`` the athletics tables (or the whole ``schema``)
+    are dropped first, so the database can be re-seeded in place. Everything
+    runs in one transaction.
+    """
+    with get_pool(dsn).connection() as conn:
+        with conn.transaction():
+            if reset and schema:
+                conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+            elif reset:
+                conn.execute(f"DROP TABLE IF EXISTS {', '.join(TABLES)} CASCADE")
+            with PostgresCopyWriter(conn, batch_size=batch_size) as cur:
+                build_db(context, cur, schema=schema, indexes=indexes)
+        if schema:
+            # The pooled connection outlives this build
+            conn.execute("RESET search_path")
+    return dsn
+
+
+def build_template_db(context, template, dsn="", batch_size=BATCH_SIZE, indexes=False):
+    """
+    Build the context into its own database ``template`` on the server at
+    ``dsn`` and mark it as a template. Resetting a task is then a file-level
+    copy (``CREATE DATABASE ... TEMPLATE``, see templates.py) instead of a
+    re-seed. An existing ``template`` is rebuilt.
+    """
+    from psycopg.conninfo import make_conninfo
+
+    drop_database(dsn, template)
+    create_database(dsn, template)
+    template_dsn = make_conninfo(dsn, dbname=template)
+    build_postgres_db(context, dsn=template_dsn, batch_size=batch_size, reset=False, indexes=indexes)
+    # A template cannot be copied while anyone is connected to it
+    close_pool(template_dsn)
+    mark_template(dsn, template)
+    return template
+
+
 DATA_DIR = (
     Path(__file__).resolve().parent.parent
     / "external"
@@ -220,8 +564,238 @@ DATA_DIR = (
     / "pilote_Dataset"
     # / "Test_Dataset_with_Splits"
 )
+TEMPLATE_PATH = Path(__file__).resolve().parent / "TASK.md.j2"
+SPLIT_COLUMNS = ("Questions", "Answers", "Context")
 MAX_ROWS_PER_SPLIT = 1
 SEED = 0
+JOBS = 1
+
+JINJA_CACHE_DIR = Path(__file__).resolve().parent / ".jinja_cache"
+
+# Files written per task, by suffix
+PARTS = ("sql", "txt", "md")
+LAYOUTS = ("flat", "sharded")
+# Tasks per directory in the sharded layout
+SHARD_SIZE = 1000
+
+MANIFEST_NAME = ".init_manifest.json"
+# Bump when the generated files change for the same inputs, so a manifest
+# written by an older version regenerates everything
+MANIFEST_VERSION = 1
+
+# Task renderer, set once per process by init_worker
+_renderer = None
+
+
+class TaskRenderer:
+    """Render TASK.md files from a template that is compiled and rendered once.
+
+    The template is loaded through a Jinja Environment backed by an on-disk
+    bytecode cache. The first render for a given set of variables renders the
+    template with marker values and keeps the static text between them, so
+    later renders only splice the per-row values into the cached fragments.
+    Variables must be emitted verbatim (``{{ question }}``) for this to hold;
+    falsy values are rendered as empty.
+    """
+
+    MARKER_RE = re.compile(r"\x00(\w+)\x00")
+
+    def __init__(self, template_path=TEMPLATE_PATH, cache_dir=JINJA_CACHE_DIR):
+        template_path = Path(template_path)
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.env = Environment(
+            loader=FileSystemLoader(template_path.parent),
+            bytecode_cache=FileSystemBytecodeCache(str(cache_dir)),
+        )
+        self.template = self.env.get_template(template_path.name)
+        self.fragments = {}
+
+    def _fragments(self, values):
+        """Return the static fragments and variable names for these values."""
+        key = tuple(sorted((name, bool(value)) for name, value in values.items()))
+        fragments = self.fragments.get(key)
+        if fragments is None:
+            marked = {
+                name: f"\x00{name}\x00" if value else "" for name, value in values.items()
+            }
+            # Alternating [text, name, text, name, ..., text]
+            fragments = self.MARKER_RE.split(self.template.render(**marked))
+            self.fragments[key] = fragments
+        return fragments
+
+    def render(self, **values):
+        fragments = self._fragments(values)
+        parts = [fragments[0]]
+        for i in range(1, len(fragments), 2):
+            parts.append(str(values[fragments[i]]))
+            parts.append(fragments[i + 1])
+        return "".join(parts)
+
+
+def init_worker(template_path=TEMPLATE_PATH):
+    """Build the task renderer once for the current (worker) process.
+
+    The Postgres pools the process opens are closed when it exits. Pool
+    workers skip atexit hooks, so this goes through multiprocessing's
+    finalizers, which they do run.
+    """
+    global _renderer
+    if _renderer is None:
+        Finalize(None, close_pools, exitpriority=0)
+    _renderer = TaskRenderer(template_path)
+
+
+def generate_task(
+    base_filename,
+    context,
+    question,
+    answer,
+    mode="insert",
+    batch_size=BATCH_SIZE,
+    backend="file",
+    dsn="",
+    schema=None,
+    indexes=False,
+    parts=PARTS,
+):
+    """Write the .sql, .txt and .md files for one dataset row.
+
+    Only the files in ``parts`` are written, so a template change can
+    re-render the .md files without parsing the context again. The
+    directory of ``base_filename`` is created if needed.
+
+    With the ``postgres`` backend the context is loaded into the database at
+    ``dsn`` instead of being written to a .sql file, and with the ``template``
+    backend into a template database of its own (``tmpl_<task>``). With
+    ``schema`` the task's tables live in that schema and TASK.md tells the
+    agent to use it.
+    """
+    Path(base_filename).parent.mkdir(parents=True, exist_ok=True)
+    # Load the context into the database or write it to a .sql file
+    if "sql" in parts:
+        if backend == "postgres":
+            build_postgres_db(
+                context=[context], dsn=dsn, batch_size=batch_size, schema=schema, indexes=indexes
+            )
+        elif backend == "template":
+            build_template_db(
+                context=[context],
+                template=database_name(Path(base_filename).name),
+                dsn=dsn,
+                batch_size=batch_size,
+                indexes=indexes,
+            )
+        else:
+            build_sqlite_db_to_file(
+                context=[context],
+                filepath=f"{base_filename}.sql",
+                mode=mode,
+                batch_size=batch_size,
+                schema=schema,
+                indexes=indexes,
+            )
+
+    # Write question and answer to txt file
+    if "txt" in parts:
+        with open(f"{base_filename}.txt", "w") as f:
+            f.write(f"Questions,Answers\n")
+            f.write(f'"{question}","{answer}"\n')
+
+    # Generate markdown file for this row's question
+    if "md" in parts:
+        if _renderer is None:
+            init_worker()
+        output = _renderer.render(question=question, schema=schema)
+        Path(f"{base_filename}.md").write_text(output)
+
+    return base_filename
+
+
+def _generate_task_args(args, options):
+    *args, schema, parts = args
+    return generate_task(*args, schema=schema, parts=parts, **options)
+
+
+def task_path(output_dir, key, idx, layout="flat"):
+    """Base filename of row ``idx`` of split ``key``.
+
+    The ``flat`` layout puts every task in ``output_dir``; the ``sharded`` one
+    in ``output_dir/{key}/{idx // SHARD_SIZE:04d}/``, so no directory holds
+    more than SHARD_SIZE tasks.
+    """
+    if layout == "sharded":
+        return Path(output_dir) / key / f"{idx // SHARD_SIZE:04d}" / f"{key}_{idx}"
+    return Path(output_dir) / f"{key}_{idx}"
+
+
+def _digest(*values):
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def input_digests(context, question, answer, schema, template_digest, options):
+    """Hash of the inputs of each file of a task: what it must be rebuilt for."""
+    return {
+        "sql": _digest(context, schema, options["mode"], options["batch_size"], options["indexes"]),
+        "txt": _digest(question, answer),
+        "md": _digest(question, schema, template_digest),
+    }
+
+
+class Manifest:
+    """Input hashes of every generated file, to only regenerate what changed.
+
+    A file is up to date while its inputs hash the same and its size and
+    mtime are the ones recorded when it was written.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data["entries"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def _key(self, base_filename):
+        return os.path.relpath(base_filename, self.path.parent)
+
+    def stale_parts(self, base_filename, digests):
+        """The parts of a task whose inputs or files changed since they were written."""
+        entry = self.entries.get(self._key(base_filename), {})
+        stale = []
+        for part, digest in digests.items():
+            recorded = entry.get(part)
+            path = Path(f"{base_filename}.{part}")
+            if recorded is None or recorded["digest"] != digest or not path.exists():
+                stale.append(part)
+                continue
+            stat = path.stat()
+            if recorded["stamp"] != [stat.st_size, stat.st_mtime_ns]:
+                stale.append(part)
+        return stale
+
+    def update(self, base_filename, digests, parts):
+        """Record the inputs of the ``parts`` just written."""
+        entry = self.entries.setdefault(self._key(base_filename), {})
+        for part in parts:
+            stat = Path(f"{base_filename}.{part}").stat()
+            entry[part] = {"digest": digests[part], "stamp": [stat.st_size, stat.st_mtime_ns]}
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
 
 
 if __name__ == "__main__":
@@ -234,6 +808,72 @@ if __name__ == "__main__":
     parser.add_argument(
         "--seed", type=int, default=SEED, help=f"Random seed for sampling (default: {SEED})"
     )
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=DATA_DIR,
+        help="Directory of split TSVs, e.g. one written by synth.py (default: the pilot dataset)",
+    )
+    parser.add_argument(
+        "--split",
+        action="append",
+        help="Split to load from --data-dir, repeatable (default: the pilot split)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=Path("."),
+        help="Directory the task files are written to (default: the current directory)",
+    )
+    parser.add_argument(
+        "--layout",
+        choices=LAYOUTS,
+        default="flat",
+        help=f"Write every task to --output-dir, or to {{split}}/{{row // {SHARD_SIZE}:04d}}/ under it (default: flat)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help=f"Regenerate every file, even those {MANIFEST_NAME} records as up to date",
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Sample rows through a cached byte-offset index instead of streaming each split",
+    )
+    parser.add_argument(
+        "--sql-mode",
+        choices=SQL_MODES,
+        default="insert",
+        help="How rows are written: one INSERT per row, batched multi-row VALUES, or COPY blocks (default: insert)",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=BATCH_SIZE, help=f"Rows per VALUES/COPY batch (default: {BATCH_SIZE})"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=JOBS, help=f"Worker processes used to generate rows (default: {JOBS})"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=("file", "postgres", "template"),
+        default="file",
+        help="Write each task's database to a .sql file, load it into a live Postgres, or build it into a template database tmpl_<task> per task (default: file)",
+    )
+    parser.add_argument(
+        "--dsn",
+        default="",
+        help="libpq connection string for --backend postgres/template (default: PGHOST, PGUSER, ... from the environment)",
+    )
+    parser.add_argument(
+        "--indexes",
+        action="store_true",
+        help="Add foreign keys and indexes on the join/filter columns after loading, then ANALYZE",
+    )
+    parser.add_argument(
+        "--single-db",
+        action="store_true",
+        help="Put each task in its own schema (task_0000, ...) and also write one {split}.sql per split holding every task",
+    )
     args = parser.parse_args()
 
     # Use the seed from command line argument
@@ -243,44 +883,131 @@ if __name__ == "__main__":
     MAX_ROWS_PER_SPLIT = args.rows
 
     def load_split(name):
-        df = pd.read_csv(DATA_DIR / f"{name}.tsv", sep="	")
-        if MAX_ROWS_PER_SPLIT is not None:
-            df = df.sample(
-                n=min(MAX_ROWS_PER_SPLIT, len(df)), random_state=SEED
-            ).reset_index(drop=True)
-        return df
-
-    splits = {
-        "Easy_SymCode_pilot_20_failed_20_success": load_split("Easy_SymCode_pilot_20_failed_20_success"),
-        # "CounterFactual": load_split("CounterFactual"),
-        # "Original_Small_Table": load_split("Original_Small_Table"),
-        # "Original_Large_Table": load_split("Original_Large_Table"),
-        # "Easy": load_split("Easy"),
-        # "Medium": load_split("Medium"),
-        # "Hard": load_split("Hard"),
+        rows, _ = sample_rows(
+            args.data_dir / f"{name}.tsv",
+            MAX_ROWS_PER_SPLIT,
+            seed=SEED,
+            columns=SPLIT_COLUMNS,
+            index=args.index,
+        )
+        return rows
+
+    if args.split:
+        splits = {name: load_split(name) for name in args.split}
+    else:
+        splits = {
+            "Easy_SymCode_pilot_20_failed_20_success": load_split("Easy_SymCode_pilot_20_failed_20_success"),
+            # "CounterFactual": load_split("CounterFactual"),
+            # "Original_Small_Table": load_split("Original_Small_Table"),
+            # "Original_Large_Table": load_split("Original_Large_Table"),
+            # "Easy": load_split("Easy"),
+            # "Medium": load_split("Medium"),
+            # "Hard": load_split("Hard"),
+        }
+
+    options = {
+        "mode": args.sql_mode,
+        "batch_size": args.batch_size,
+        "backend": args.backend,
+        "dsn": args.dsn,
+        "indexes": args.indexes,
     }
-
+    template_digest = hashlib.sha1(TEMPLATE_PATH.read_bytes()).hexdigest()
+    manifest = Manifest(args.output_dir / MANIFEST_NAME)
+
+    # One job per row, in split order then row order. Output names only
+    # depend on the split key and row index, so they are stable across runs.
+    # Only the files whose inputs changed are regenerated; databases are
+    # always loaded, as the manifest only tracks files.
+    tasks = []
     for key in splits:
-        print(f"Processing split: {key}")
-        df = splits[key]
-        
-        # Iterate over each row in the dataframe
-        for idx, row in df.iterrows():
-            # Create unique filenames for each row
-            base_filename = f"{key}_{idx}"
-            
-            # Generate SQL file for this row's context
-            build_sqlite_db_to_file(context=[row["Context"]], filepath=f"{base_filename}.sql")
-            
-            # Write question and answer to txt file
-            with open(f"{base_filename}.txt", "w") as f:
-                f.write(f"Questions,Answers\n")
-                f.write(f'"{row["Questions"]}","{row["Answers"]}"\n')
-            
-            # Generate markdown file for this row's question
-            template_text = Path("TASK.md.j2").read_text()
-            template = Template(template_text)
-            output = template.render(question=row["Questions"])
-            Path(f"{base_filename}.md").write_text(output)
-            
-            print(f"  Generated files for row {idx}: {base_filename}.{{sql,txt,md}}")
+        for idx, row in enumerate(splits[key]):
+            schema = schema_name(len(tasks)) if args.single_db else None
+            base_filename = str(task_path(args.output_dir, key, idx, args.layout))
+            digests = input_digests(
+                row["Context"], row["Questions"], row["Answers"], schema, template_digest, options
+            )
+            if args.backend != "file":
+                del digests["sql"]
+            parts = list(digests) if args.force else manifest.stale_parts(base_filename, digests)
+            if args.backend != "file":
+                parts.insert(0, "sql")
+            tasks.append(
+                (
+                    key,
+                    idx,
+                    (base_filename, row["Context"], row["Questions"], row["Answers"], schema, parts),
+                    digests,
+                )
+            )
+
+    if args.backend == "postgres" and len(tasks) > 1 and not args.single_db:
+        parser.error(
+            "--backend postgres seeds a single database, select one row with --rows 1 or use --single-db"
+        )
+    if args.backend == "template" and args.single_db:
+        parser.error("--backend template builds one database per task, it cannot be combined with --single-db")
+
+    generate = partial(_generate_task_args, options=options)
+    pending = [t[2] for t in tasks if t[2][-1]]
+    start = time.perf_counter()
+    if args.jobs > 1 and pending:
+        executor = ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker)
+        chunksize = max(1, len(pending) // (args.jobs * 4))
+        # map() yields results in submission order, so the log stays deterministic
+        generated = executor.map(generate, pending, chunksize=chunksize)
+    else:
+        executor = None
+        if pending:
+            init_worker()
+        generated = map(generate, pending)
+
+    current_key = None
+    try:
+        for key, idx, (base_filename, *_, parts), digests in tasks:
+            if key != current_key:
+                print(f"Processing split: {key}")
+                current_key = key
+            if not parts:
+                print(f"  Up to date row {idx}: {base_filename}")
+                continue
+            next(generated)
+            manifest.update(base_filename, digests, [p for p in parts if p in digests])
+            # Without a .sql file, the "sql" part is the database itself
+            rebuilt = ", ".join(p if p in digests else "db" for p in parts)
+            print(f"  Rebuilt row {idx} ({rebuilt}): {base_filename}")
+    finally:
+        manifest.save()
+        if executor is not None:
+            # After a failure, do not wait for the rows nobody will read
+            executor.shutdown(cancel_futures=True)
+        close_pools()
+
+    elapsed = time.perf_counter() - start
+    # End to end: parsing, SQL, rendering and file writes (bench.py times parsing alone)
+    rate = f"{len(pending) / elapsed:.1f} rows/s end to end" if pending and elapsed > 0 else "nothing to do"
+    print(f"Rebuilt {len(pending)} of {len(tasks)} rows in {elapsed:.2f}s ({rate})")
+
+    if args.single_db and args.backend == "file":
+        # Each task's .sql creates its own schema, so the split database is
+        # just their concatenation, in task order. Its digest covers which
+        # task files go in and their inputs, so a different --rows or seed
+        # rebuilds it even when every task file was up to date.
+        for key in splits:
+            split_tasks = [(base, digests) for task_key, _, (base, *_), digests in tasks if task_key == key]
+            split_base = str(args.output_dir / key)
+            split_digests = {
+                "sql": _digest(
+                    *((os.path.relpath(base, args.output_dir), digests["sql"]) for base, digests in split_tasks)
+                )
+            }
+            if not args.force and not manifest.stale_parts(split_base, split_digests):
+                print(f"Up to date split database: {split_base}.sql")
+                continue
+            with open(f"{split_base}.sql", "w") as out:
+                for base_filename, _ in split_tasks:
+                    with open(f"{base_filename}.sql") as f:
+                        shutil.copyfileobj(f, out)
+            manifest.update(split_base, split_digests, ["sql"])
+            print(f"Generated split database: {split_base}.sql")
+        manifest.save()
@@ -0,0 +1,422 @@
+# Seeded synthetic athlete contexts and question/answer splits for load testing
+
+import argparse
+import csv
+import json
+import math
+import random
+import time
+from collections import Counter, namedtuple
+from pathlib import Path
+
+SYNTH_DIR = Path(__file__).resolve().parent / ".cache" / "synth"
+SPLIT_COLUMNS = ("Questions", "Answers", "Context", "Difficulty")
+SPLITS = ("Easy", "Medium", "Hard")
+
+ATHLETES = 1000
+SEED = 0
+MEDALS = "poisson:6"
+MAX_MEDALS = 500
+MEDAL_WEIGHTS = (1.0, 1.0, 1.0)
+YEARS = (1990, 2024)
+# Share of athletes whose birth date is a bare year
+YEAR_ONLY_RATE = 0.1
+
+MEDAL_TYPES = ("MedalGold", "MedalSilver", "MedalBronze")
+
+FIRST_NAMES = (
+    "Ada", "Bruno", "Carl", "Dana", "Elena", "Farid", "Greta", "Hiro", "Ines", "Jonas",
+    "Kaia", "Luca", "Maya", "Nils", "Olga", "Pavel", "Quinn", "Rosa", "Sami", "Tove",
+    "Uma", "Viktor", "Wen", "Ximena", "Yusuf", "Zoe", "Amir", "Bea", "Cato", "Dmitri",
+    "Emma", "Felix", "Gia", "Hugo", "Ilse", "Jade", "Kenji", "Lea", "Milo", "Nora",
+)
+LAST_NAMES = (
+    "Fratus", "Hester", "Dujardin", "Held", "Karlsson", "Dressel", "Almeida", "Berg",
+    "Castro", "Dubois", "Eriksen", "Fischer", "Garcia", "Horvath", "Ivanova", "Jensen",
+    "Kowalski", "Larsen", "Moreau", "Nakamura", "Okafor", "Petrov", "Quist", "Rossi",
+    "Schmidt", "Tanaka", "Ueda", "Varga", "Weber", "Xu", "Yilmaz", "Zhang", "Novak",
+    "Silva", "Costa", "Meyer", "Bauer", "Kim", "Lopez", "Murphy",
+)
+COUNTRIES = (
+    "Brazil", "Great Britain", "United States", "Sweden", "France", "Germany", "Japan",
+    "Italy", "Hungary", "Poland", "Norway", "Kenya", "China", "Australia", "Canada",
+)
+# Events by sport; an athlete competes in the events of one sport
+SPORTS = {
+    "swimming": (
+        "50 m freestyle", "100 m freestyle", "200 m freestyle", "100 m butterfly",
+        "100 m backstroke", "4x100 m freestyle relay", "4x100 m medley relay",
+    ),
+    "athletics": ("100 m", "200 m", "400 m", "4x100 m relay", "Long jump", "High jump", "Marathon"),
+    "dressage": ("Individual", "Team", "Freestyle"),
+    "sailing": ("Laser", "49er", "Finn", "Nacra 17", "470"),
+    "table tennis": ("Singles", "Doubles", "Mixed doubles", "Team"),
+}
+# Tournaments and their host cities; names contain no commas, which separate medal entries
+TOURNAMENTS = {
+    "Olympic Games": ("Atlanta", "Sydney", "Athens", "Beijing", "London", "Rio de Janeiro", "Tokyo", "Paris"),
+    "World Championships": ("Budapest", "Gwangju", "Kazan", "Doha", "Fukuoka", "Barcelona", "Rome"),
+    "European Championships": ("Glasgow", "Berlin", "London", "Rome", "Belgrade", "Munich"),
+    "Commonwealth Games": ("Manchester", "Melbourne", "Delhi", "Glasgow", "Gold Coast", "Birmingham"),
+    "Pan American Games": ("Winnipeg", "Santo Domingo", "Guadalajara", "Toronto", "Lima", "Santiago"),
+    "World Cup": ("Doha", "Eindhoven", "Tokyo", "Stockholm", "Singapore", "Berlin"),
+}
+
+Medal = namedtuple("Medal", "tournament format type year location")
+Athlete = namedtuple("Athlete", "name birth country medals")
+
+
+def parse_distribution(spec):
+    """Parse a medal count distribution into a function of a Random.
+
+    ``fixed:N``, ``uniform:LO-HI``, ``poisson:MEAN`` or ``pareto:ALPHA``
+    (heavy-tailed: most athletes win a few medals, some win hundreds).
+    """
+    kind, _, value = spec.partition(":")
+    try:
+        if kind == "fixed":
+            n = int(value)
+            return lambda rng: n
+        if kind == "uniform":
+            low, _, high = value.partition("-")
+            low, high = int(low), int(high)
+            return lambda rng: rng.randint(low, high)
+        if kind == "poisson":
+            return poisson_sampler(float(value))
+        if kind == "pareto":
+            alpha = float(value)
+            return lambda rng: int(rng.paretovariate(alpha))
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid medal distribution: {spec!r} (expected fixed:N, uniform:LO-HI, poisson:MEAN or pareto:ALPHA)")
+
+
+def poisson_sampler(mean):
+    """Poisson sampler: Knuth's method for small means, a rounded normal for large ones."""
+    if mean > 50:
+        return lambda rng: max(0, round(rng.gauss(mean, math.sqrt(mean))))
+    limit = math.exp(-mean)
+
+    def sample(rng):
+        k = 0
+        p = rng.random()
+        while p > limit:
+            k += 1
+            p *= rng.random()
+        return k
+
+    return sample
+
+
+def athlete_name(index):
+    """A unique name per index: first and last names, numbered once combinations run out."""
+    first = FIRST_NAMES[index % len(FIRST_NAMES)]
+    last = LAST_NAMES[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    round_ = index // (len(FIRST_NAMES) * len(LAST_NAMES))
+    return f"{first} {last}" + (f" {round_ + 1}" if round_ else "")
+
+
+def generate_athlete(
+    index,
+    seed=SEED,
+    medals=None,
+    max_medals=MAX_MEDALS,
+    medal_weights=MEDAL_WEIGHTS,
+    years=YEARS,
+    year_only_rate=YEAR_ONLY_RATE,
+):
+    """Generate athlete ``index``.
+
+    Every athlete has its own Random seeded from ``seed`` and ``index``, so any
+    range of athletes can be generated on its own and comes out the same.
+    Athletes win at least one medal.
+    """
+    rng = random.Random((seed << 32) | index)
+    medals = medals or parse_distribution(MEDALS)
+    first_year, last_year = years
+
+    birth_year = rng.randint(first_year - 35, last_year - 20)
+    if rng.random() < year_only_rate:
+        birth = (birth_year, None, None)
+    else:
+        birth = (birth_year, rng.randint(1, 12), rng.randint(1, 28))
+
+    events = SPORTS[rng.choice(sorted(SPORTS))]
+    tournaments = rng.sample(sorted(TOURNAMENTS), rng.randint(1, len(TOURNAMENTS)))
+    formats = rng.sample(events, rng.randint(1, len(events)))
+    # Careers start between 15 and 25
+    career_start = max(first_year, birth_year + rng.randint(15, 25))
+    career_end = min(last_year, career_start + rng.randint(2, 20))
+    career_start = min(career_start, career_end)
+
+    count = min(max(1, medals(rng)), max_medals)
+    hosts = {}
+    result = []
+    for _ in range(count):
+        tournament = rng.choice(tournaments)
+        year = rng.randint(career_start, career_end)
+        # One host city per tournament edition
+        location = hosts.get((tournament, year))
+        if location is None:
+            location = hosts[tournament, year] = rng.choice(TOURNAMENTS[tournament])
+        result.append(
+            Medal(
+                tournament,
+                rng.choice(formats),
+                rng.choices(MEDAL_TYPES, weights=medal_weights)[0],
+                year,
+                location,
+            )
+        )
+    # Grouped as the context lists them: by tournament, then format, then year
+    order = {t: i for i, t in enumerate(tournaments)}
+    result.sort(key=lambda m: (order[m.tournament], formats.index(m.format), m.year))
+    return Athlete(athlete_name(index), birth, rng.choice(COUNTRIES), result)
+
+
+def format_context(athlete):
+    """The athlete as a context in the dataset's text format."""
+    year, month, day = athlete.birth
+    birth = str(year) if month is None else f"{year}-{month:02d}-{day:02d}"
+    lines = [athlete.name, "Birth date", birth, "Country representing", athlete.country]
+    tournament = None
+    fmt = None
+    entries = []
+    for medal in athlete.medals + [None]:
+        if medal is None or (medal.tournament, medal.format) != (tournament, fmt):
+            if entries:
+                lines.append(f"{fmt}\t{', '.join(entries)}")
+                entries = []
+            if medal is None:
+                break
+            if medal.tournament != tournament:
+                lines.append(medal.tournament)
+            tournament, fmt = medal.tournament, medal.format
+        entries.append(f"{medal.type} | {medal.year} | {medal.location}")
+    return "\n".join(lines) + "\n"
+
+
+def _join(values):
+    return ", ".join(sorted(values))
+
+
+def _most_medals(athlete):
+    counts = Counter(m.tournament for m in athlete.medals)
+    top = max(counts.values())
+    return _join(t for t, n in counts.items() if n == top)
+
+
+def _most_recent_city(athlete):
+    last = max(m.year for m in athlete.medals)
+    return _join({m.location for m in athlete.medals if m.year == last})
+
+
+def _medal_years(athlete):
+    return sorted({m.year for m in athlete.medals})
+
+
+# Questions per split: (template, answer function). Answers follow the
+# conventions of the dataset: counts as numbers, lists comma-separated.
+QUESTIONS = {
+    "Easy": (
+        (
+            "How many medals did {name} win in {year}?",
+            lambda a, year: str(sum(m.year == year for m in a.medals)),
+        ),
+        (
+            "List all the formats in which {name} has won medals in?",
+            lambda a, year: _join({m.format for m in a.medals}),
+        ),
+        (
+            "How many gold medals has {name} won?",
+            lambda a, year: str(sum(m.type == "MedalGold" for m in a.medals)),
+        ),
+    ),
+    "Medium": (
+        (
+            "Which tournament(s) has {name} won the most Medals in?",
+            lambda a, year: _most_medals(a),
+        ),
+        (
+            "Which city did {name} win his/her most recent medal?",
+            lambda a, year: _most_recent_city(a),
+        ),
+    ),
+    "Hard": (
+        (
+            "How many medals did {name} win in his/her twenties?",
+            lambda a, year: str(sum(20 <= m.year - a.birth[0] <= 29 for m in a.medals)),
+        ),
+        (
+            "In how many different years did {name} win at least one medal?",
+            lambda a, year: str(len(_medal_years(a))),
+        ),
+    ),
+}
+
+
+def generate_question(athlete, split, index, seed=SEED):
+    """A question about ``athlete`` from ``split`` and its answer, picked by ``seed``."""
+    rng = random.Random(f"{seed}:{index}:{split}")
+    template, answer = rng.choice(QUESTIONS[split])
+    # Half the year questions ask about a year with medals
+    years = _medal_years(athlete)
+    year = rng.choice(years) if rng.random() < 0.5 else rng.randint(years[0] - 2, years[-1] + 2)
+    return template.format(name=athlete.name, year=year), answer(athlete, year)
+
+
+def iter_athletes(count, start=0, **options):
+    """Yield athletes ``start`` to ``start + count - 1`` (see generate_athlete)."""
+    for index in range(start, start + count):
+        yield index, generate_athlete(index, **options)
+
+
+def write_splits(output_dir, count, start=0, seed=SEED, splits=SPLITS, check=False, **options):
+    """Write one {split}.tsv per split with a question per athlete, in the dataset's format.
+
+    With ``check`` every context is parsed back with init.parse_context_to_records
+    and compared with the generated athlete. Returns the number of medals.
+    """
+    if check:
+        from init import parse_context_to_records
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    files = {split: open(output_dir / f"{split}.tsv", "w", encoding="utf-8", newline="") for split in splits}
+    medals = 0
+    try:
+        writers = {split: csv.writer(f, delimiter="\t") for split, f in files.items()}
+        for writer in writers.values():
+            writer.writerow(SPLIT_COLUMNS)
+        for index, athlete in iter_athletes(count, start=start, seed=seed, **options):
+            context = format_context(athlete)
+            medals += len(athlete.medals)
+            if check:
+                check_context(athlete, context, parse_context_to_records)
+            for split, writer in writers.items():
+                question, answer = generate_question(athlete, split, index, seed=seed)
+                writer.writerow((question, answer, context, split))
+    finally:
+        for f in files.values():
+            f.close()
+    return medals
+
+
+def check_context(athlete, context, parse):
+    """Raise ValueError if ``context`` does not parse back into ``athlete``."""
+    record = parse(context)
+    expected = [tuple(m) for m in athlete.medals]
+    if record.name != athlete.name or tuple(record.birth) != athlete.birth or [
+        tuple(m) for m in record.medals
+    ] != expected:
+        raise ValueError(f"Context of {athlete.name} does not parse back:\n{context}")
+
+
+def _parse_years(value):
+    first, _, last = value.partition("-")
+    try:
+        first, last = int(first), int(last)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid years: {value!r} (expected FIRST-LAST)")
+    if first > last:
+        raise argparse.ArgumentTypeError(f"Invalid years: {value!r} (FIRST is after LAST)")
+    return first, last
+
+
+def _parse_weights(value):
+    try:
+        weights = tuple(float(w) for w in value.split(","))
+    except ValueError:
+        weights = ()
+    if len(weights) != len(MEDAL_TYPES) or min(weights) < 0 or not sum(weights):
+        raise argparse.ArgumentTypeError(f"Invalid medal weights: {value!r} (expected GOLD,SILVER,BRONZE)")
+    return weights
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic athlete contexts with questions and answers, in the dataset's TSV format"
+    )
+    parser.add_argument(
+        "--athletes", type=int, default=ATHLETES, help=f"How many athletes to generate (default: {ATHLETES})"
+    )
+    parser.add_argument(
+        "--start", type=int, default=0, help="Index of the first athlete, to generate a shard (default: 0)"
+    )
+    parser.add_argument("--seed", type=int, default=SEED, help=f"Random seed (default: {SEED})")
+    parser.add_argument(
+        "--medals",
+        default=MEDALS,
+        help=f"Medals per athlete: fixed:N, uniform:LO-HI, poisson:MEAN or pareto:ALPHA (default: {MEDALS})",
+    )
+    parser.add_argument(
+        "--max-medals", type=int, default=MAX_MEDALS, help=f"Cap on medals per athlete (default: {MAX_MEDALS})"
+    )
+    parser.add_argument(
+        "--medal-weights",
+        type=_parse_weights,
+        default=MEDAL_WEIGHTS,
+        help="Relative odds of gold, silver and bronze (default: 1,1,1)",
+    )
+    parser.add_argument(
+        "--years",
+        type=_parse_years,
+        default=YEARS,
+        help=f"Years medals are won in (default: {YEARS[0]}-{YEARS[1]})",
+    )
+    parser.add_argument(
+        "--year-only-rate",
+        type=float,
+        default=YEAR_ONLY_RATE,
+        help=f"Share of birth dates given as a bare year (default: {YEAR_ONLY_RATE})",
+    )
+    parser.add_argument(
+        "--split", choices=SPLITS, action="append", help="Split to write, repeatable (default: all)"
+    )
+    parser.add_argument(
+        "--output-dir", default=SYNTH_DIR, help=f"Directory for the split TSVs (default: {SYNTH_DIR})"
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Parse every context back with init.py's parser and fail on any difference",
+    )
+    args = parser.parse_args()
+
+    try:
+        medals = parse_distribution(args.medals)
+    except ValueError as e:
+        parser.error(str(e))
+    start = time.perf_counter()
+    total = write_splits(
+        args.output_dir,
+        args.athletes,
+        start=args.start,
+        seed=args.seed,
+        splits=args.split or SPLITS,
+        check=args.check,
+        medals=medals,
+        max_medals=args.max_medals,
+        medal_weights=args.medal_weights,
+        years=args.years,
+        year_only_rate=args.year_only_rate,
+    )
+    elapsed = time.perf_counter() - start
+
+    settings = {
+        "athletes": args.athletes,
+        "start": args.start,
+        "seed": args.seed,
+        "medals": args.medals,
+        "max_medals": args.max_medals,
+        "medal_weights": args.medal_weights,
+        "years": args.years,
+        "year_only_rate": args.year_only_rate,
+        "total_medals": total,
+    }
+    with open(Path(args.output_dir) / "synth.json", "w", encoding="utf-8") as f:
+        json.dump(settings, f, indent=2)
+    print(
+        f"Generated {args.athletes} athletes with {total} medals in {elapsed:.2f}s: "
+        f"{', '.join(f'{split}.tsv' for split in args.split or SPLITS)} in {args.output_dir}"
+    )
@@ -0,0 +1,171 @@
+# Template databases: build a task once, then reset it with a file-level copy
+
+import argparse
+import hashlib
+import subprocess
+import time
+
+TEMPLATE_PREFIX = "tmpl_"
+DATABASE_PREFIX = "task_"
+# Postgres truncates longer identifiers
+MAX_IDENTIFIER_LENGTH = 63
+
+
+def database_name(task, prefix=TEMPLATE_PREFIX):
+    """Database name for ``task`` (``Easy_0`` -> ``tmpl_easy_0``).
+
+    Names that would be too long are cut and made unique with a hash.
+    """
+    name = prefix + "".join(c if c.isalnum() else "_" for c in task.lower())
+    if len(name) > MAX_IDENTIFIER_LENGTH:
+        digest = hashlib.sha1(task.encode("utf-8")).hexdigest()[:8]
+        name = f"{name[:MAX_IDENTIFIER_LENGTH - 9]}_{digest}"
+    return name
+
+
+def admin_connection(dsn=""):
+    """Autocommit connection, as CREATE/DROP DATABASE cannot run in a transaction."""
+    import psycopg
+
+    return psycopg.connect(dsn, autocommit=True)
+
+
+def database_exists(dsn, database):
+    with admin_connection(dsn) as conn:
+        return (
+            conn.execute("SELECT 1 FROM pg_database WHERE datname = %s", (database,)).fetchone()
+            is not None
+        )
+
+
+def drop_database(dsn, database):
+    """Drop ``database`` if it exists, even if it is a template or in use."""
+    from psycopg import sql
+
+    name = sql.Identifier(database)
+    with admin_connection(dsn) as conn:
+        if conn.execute("SELECT 1 FROM pg_database WHERE datname = %s", (database,)).fetchone():
+            conn.execute(sql.SQL("ALTER DATABASE {} WITH IS_TEMPLATE false").format(name))
+            conn.execute(sql.SQL("DROP DATABASE {} WITH (FORCE)").format(name))
+
+
+def create_database(dsn, database, template=None):
+    """Create ``database``, as a copy of ``template`` if given."""
+    from psycopg import sql
+
+    query = sql.SQL("CREATE DATABASE {}").format(sql.Identifier(database))
+    if template:
+        query += sql.SQL(" TEMPLATE {}").format(sql.Identifier(template))
+    with admin_connection(dsn) as conn:
+        conn.execute(query)
+
+
+def mark_template(dsn, database, comment=None):
+    """Turn ``database`` into a template that nobody can connect to.
+
+    Without connections it can always be cloned. ``comment`` is stored as
+    the database comment, e.g. a hash of what it was built from.
+    """
+    from psycopg import sql
+
+    name = sql.Identifier(database)
+    with admin_connection(dsn) as conn:
+        if comment is not None:
+            conn.execute(sql.SQL("COMMENT ON DATABASE {} IS {}").format(name, sql.Literal(comment)))
+        conn.execute(sql.SQL("ALTER DATABASE {} WITH IS_TEMPLATE true ALLOW_CONNECTIONS false").format(name))
+
+
+def template_comment(dsn, database):
+    """The comment of ``database``, or None if it has none or does not exist."""
+    with admin_connection(dsn) as conn:
+        row = conn.execute(
+            "SELECT shobj_description(oid, 'pg_database') FROM pg_database WHERE datname = %s",
+            (database,),
+        ).fetchone()
+    return row[0] if row else None
+
+
+def file_digest(path):
+    """SHA-1 of a file's contents, read in blocks."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_sql(dsn, database, sql_file):
+    """Run ``sql_file`` in ``database`` with psql, in one transaction that stops at the first error."""
+    from psycopg.conninfo import make_conninfo
+
+    cmd = [
+        "psql", "-X", "-q", "-v", "ON_ERROR_STOP=1", "-1",
+        "-d", make_conninfo(dsn, dbname=database),
+        "-f", str(sql_file),
+    ]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+
+
+def build_template(dsn, template, sql_file, digest=None):
+    """Load ``sql_file`` into the template ``template`` unless it was built from the same file.
+
+    The template is tagged with the file's ``digest`` (computed if not
+    given), so it is only rebuilt when the file changes. Returns whether it
+    was (re)built.
+    """
+    digest = digest or file_digest(sql_file)
+    if template_comment(dsn, template) == digest:
+        return False
+    drop_database(dsn, template)
+    create_database(dsn, template)
+    load_sql(dsn, template, sql_file)
+    mark_template(dsn, template, comment=digest)
+    return True
+
+
+def clone_template(dsn, template, database):
+    """(Re)create ``database`` as a file-level copy of ``template``."""
+    drop_database(dsn, database)
+    create_database(dsn, database, template=template)
+    return database
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reset task databases from the templates built by init.py --backend template"
+    )
+    parser.add_argument("tasks", nargs="+", help="Task names, e.g. Easy_0")
+    parser.add_argument(
+        "--database",
+        default=None,
+        help=f"Database to reset, with a single task (default: {DATABASE_PREFIX}<task>)",
+    )
+    parser.add_argument(
+        "--drop", action="store_true", help="Drop the task databases instead of resetting them"
+    )
+    parser.add_argument(
+        "--drop-templates", action="store_true", help="Also drop the templates (with --drop)"
+    )
+    parser.add_argument(
+        "--dsn", default="", help="libpq connection string (default: PGHOST, PGUSER, ... from the environment)"
+    )
+    args = parser.parse_args()
+
+    if args.database and len(args.tasks) > 1:
+        parser.error("--database needs exactly one task")
+
+    for task in args.tasks:
+        template = database_name(task)
+        database = args.database or database_name(task, prefix=DATABASE_PREFIX)
+        if args.drop:
+            drop_database(args.dsn, database)
+            print(f"Dropped {database}")
+            if args.drop_templates:
+                drop_database(args.dsn, template)
+                print(f"Dropped {template}")
+            continue
+        if not database_exists(args.dsn, template):
+            parser.exit(1, f"Template {template} not found, build it with init.py --backend template\n")
+        start = time.perf_counter()
+        clone_template(args.dsn, template, database)
+        print(f"Reset {database} from {template} in {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,82 @@
+"""Shared fixtures: the pilot split and a local Postgres server.
+
+The server is found through the PG* environment variables and psql must be
+on the PATH; tests using the Postgres fixtures are skipped otherwise. Their
+databases get unique names and are dropped afterwards.
+"""
+
+import shutil
+import uuid
+from pathlib import Path
+
+import pytest
+
+from templates import create_database, drop_database
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PILOT_SPLIT = (
+    REPO_ROOT
+    / "external"
+    / "nsum"
+    / "Dataset"
+    / "pilote_Dataset"
+    / "Easy_SymCode_pilot_20_failed_20_success.tsv"
+)
+
+
+def server_available():
+    if shutil.which("psql") is None:
+        return False
+    try:
+        import psycopg
+
+        psycopg.connect("", connect_timeout=3).close()
+    except Exception:
+        return False
+    return True
+
+
+@pytest.fixture(scope="session")
+def postgres():
+    """Skip unless a Postgres server and psql are available."""
+    if not server_available():
+        pytest.skip("no Postgres server or psql")
+
+
+@pytest.fixture
+def unique_name():
+    """Make database or task names unique to this test, e.g. unique_name("tmpl")."""
+    token = uuid.uuid4().hex[:8]
+    return lambda prefix="pytest": f"{prefix}_{token}"
+
+
+@pytest.fixture
+def scratch_database(postgres, unique_name):
+    """Return a function creating empty databases that are dropped after the test."""
+    created = []
+
+    def create(suffix="db"):
+        name = unique_name(f"pytest_{suffix}")
+        create_database("", name)
+        created.append(name)
+        return name
+
+    yield create
+    for name in created:
+        drop_database("", name)
+
+
+@pytest.fixture(scope="session")
+def pilot_split():
+    """Path of the pilot split, skipping when the dataset is not checked out."""
+    if not PILOT_SPLIT.exists():
+        pytest.skip(f"{PILOT_SPLIT} not found")
+    return PILOT_SPLIT
+
+
+@pytest.fixture(scope="session")
+def pilot_contexts(pilot_split):
+    """The contexts of the pilot split, in file order."""
+    from dataset import iter_rows
+
+    return [row["Context"] for row in iter_rows(pilot_split, columns=("Context",)) if row["Context"]]
@@ -0,0 +1,51 @@
+"""The task generation benchmarks against the committed baseline, tasks/bench_baseline.json.
+
+Slow, so only run with ``python -m pytest -m bench``. Peak memory is always
+compared; timings only when the baseline was recorded on a machine like
+this one (see bench.environment), otherwise re-save it there with
+``python tasks/bench.py --save``.
+"""
+
+import json
+import math
+import warnings
+
+import pytest
+
+import bench
+
+pytestmark = pytest.mark.bench
+
+
+def test_no_regressions():
+    stored = json.loads(bench.BASELINE_PATH.read_text(encoding="utf-8"))
+    dataset_rows = {
+        name: bench.load_rows(bench.DATASETS[name])
+        for name in stored["datasets"]
+        if bench.DATASETS[name].exists()
+    }
+    if not dataset_rows:
+        pytest.skip(f"none of the datasets {stored['datasets']} found")
+
+    time_tolerance = bench.TIME_TOLERANCE
+    if stored["environment"] != bench.environment():
+        warnings.warn(f"baseline recorded on {stored['environment']}, only memory is compared")
+        time_tolerance = math.inf
+
+    results = {}
+    for name, rows in dataset_rows.items():
+        results.update(
+            bench.run_benchmarks(
+                rows, sizes=stored["sizes"], repeat=stored["repeat"], mode=stored["sql_mode"], dataset=name
+            )
+        )
+    regressions = bench.compare(results, stored["results"], time_tolerance=time_tolerance)
+    regressions = bench.confirm(
+        dataset_rows,
+        regressions,
+        stored["results"],
+        repeat=stored["repeat"],
+        mode=stored["sql_mode"],
+        time_tolerance=time_tolerance,
+    )
+    assert not regressions, "\n".join(line for lines in regressions.values() for line in lines)
@@ -0,0 +1,44 @@
+"""The result table writers of check_results.py: JSONL and Parquet round trips."""
+
+import json
+
+import pytest
+
+from check_results import write_rows
+
+COLUMNS = [
+    ("experiment", "string"),
+    ("match", "bool"),
+    ("steps", "int"),
+    ("cost", "float"),
+    ("flags", "list<string>"),
+]
+ROWS = [
+    {"experiment": "Easy_0", "match": True, "steps": 3, "cost": 0.25, "flags": []},
+    {"experiment": "Hard_1", "match": False, "steps": 12, "cost": 1.5, "flags": ["timeout", "error"]},
+    {"experiment": "Medium_2", "match": None, "steps": None, "cost": None, "flags": None},
+]
+
+
+def test_jsonl_round_trip(tmp_path):
+    path = tmp_path / "results.jsonl"
+    write_rows(iter(ROWS), str(path), COLUMNS)
+    assert [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()] == ROWS
+
+
+def test_parquet_round_trip(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "results.parquet"
+    write_rows(iter(ROWS), str(path), COLUMNS)
+    table = pq.read_table(path)
+    assert table.column_names == [name for name, _ in COLUMNS]
+    *scalars, flags = table.schema.types
+    assert [str(t) for t in scalars] == ["string", "bool", "int64", "double"]
+    # Parquet names the list item field "element"
+    assert str(flags.value_type) == "string"
+    assert table.to_pylist() == ROWS
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError, match="Unknown table format"):
+        write_rows(ROWS, str(tmp_path / "results.csv"), COLUMNS)
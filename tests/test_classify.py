@@ -0,0 +1,143 @@
+"""Batch classification against a fake chat model: retries, concurrency and the rate limit."""
+
+import asyncio
+import time
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+
+import app
+
+
+class FakeChatModel(BaseChatModel):
+    """Answers with the label after "label:" in the question, failing the first ``failures[question]`` calls."""
+
+    failures: dict = Field(default_factory=dict)
+    delay: float = 0.0
+    calls: list = Field(default_factory=list)
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _answer(self, messages) -> ChatResult:
+        question = messages[-1].content
+        self.calls.append((question, time.monotonic()))
+        if self.failures.get(question, 0) > 0:
+            self.failures[question] -= 1
+            raise RuntimeError(f"transient failure for {question!r}")
+        label = question.rsplit("label:", 1)[-1].strip()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=label))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self._answer(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return self._answer(messages)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(app, "RETRY_BASE_DELAY", 0.0)
+
+
+def questions(n):
+    labels = ("easy", "medium", "hard")
+    return [f"question {i} label: {labels[i % 3]}" for i in range(n)]
+
+
+def test_results_keep_input_order():
+    llm = FakeChatModel(delay=0.01)
+    batch = questions(12)
+    labels = app.classify_questions(batch, llm=llm, concurrency=4, rps=None)
+    assert labels == [q.rsplit(" ", 1)[-1] for q in batch]
+    assert len(llm.calls) == 12
+
+
+def test_concurrency_limit():
+    llm = FakeChatModel(delay=0.02)
+    app.classify_questions(questions(12), llm=llm, concurrency=3, rps=None)
+    assert llm.max_in_flight == 3
+
+
+def test_failed_calls_are_retried():
+    batch = questions(3)
+    llm = FakeChatModel(failures={batch[1]: 2})
+    labels = app.classify_questions(batch, llm=llm, rps=None, retries=2)
+    assert labels == ["easy", "medium", "hard"]
+    assert [q for q, _ in llm.calls].count(batch[1]) == 3
+
+
+def test_exhausted_retries_are_returned_in_their_slot():
+    batch = questions(3)
+    llm = FakeChatModel(failures={batch[0]: 5})
+    labels = app.classify_questions(batch, llm=llm, rps=None, retries=1, return_exceptions=True)
+    assert isinstance(labels[0], RuntimeError)
+    assert labels[1:] == ["medium", "hard"]
+    assert [q for q, _ in llm.calls].count(batch[0]) == 2
+
+    llm = FakeChatModel(failures={batch[0]: 5})
+    with pytest.raises(RuntimeError):
+        app.classify_questions(batch, llm=llm, rps=None, retries=1)
+
+
+def test_rate_limit():
+    rps = 20.0
+    llm = FakeChatModel()
+    app.classify_questions(questions(10), llm=llm, concurrency=10, rps=rps)
+    starts = sorted(t for _, t in llm.calls)
+    # The default bucket allows a burst of ``rps`` calls
+    assert starts[-1] - starts[0] < 9 / rps
+
+    llm = FakeChatModel()
+    bucket = app.TokenBucket(rps, capacity=1)
+    app.classify_questions(questions(10), llm=llm, concurrency=10, bucket=bucket)
+    starts = sorted(t for _, t in llm.calls)
+    assert starts[-1] - starts[0] >= 9 / rps * 0.9
+
+
+def test_retries_take_a_token():
+    batch = questions(1)
+    llm = FakeChatModel(failures={batch[0]: 2})
+    bucket = app.TokenBucket(10.0, capacity=1)
+    app.classify_questions(batch, llm=llm, bucket=bucket, retries=2)
+    starts = [t for _, t in llm.calls]
+    assert len(starts) == 3
+    assert starts[-1] - starts[0] >= 2 / 10.0 * 0.9
+
+
+def test_evaluate_accuracy_with_fake_model():
+    data = [(f"question {i} label: easy", "easy" if i % 2 else "hard") for i in range(4)]
+    llm = FakeChatModel()
+    accuracy, correct, total, results, metrics = app.evaluate_accuracy(data, llm=llm, rps=None)
+    assert (correct, total) == (2, 4)
+    assert accuracy == 0.5
+    assert metrics["model"] == "FakeChatModel"
+    assert {r["tier"] for r in results} == {"llm"}
+
+
+class AnswerAll:
+    """Local router stand-in deciding every question itself."""
+
+    def classify(self, question):
+        return question.rsplit(" ", 1)[-1], "local"
+
+
+def test_local_answers_create_no_classifier(monkeypatch):
+    monkeypatch.setattr(app, "_classifiers", {})
+    data = [(q, q.rsplit(" ", 1)[-1]) for q in questions(3)]
+    accuracy, *_ = app.evaluate_accuracy(data, provider="anthropic", local_router=AnswerAll())
+    assert accuracy == 1.0
+    assert app._classifiers == {}
+    assert app.cache_stats("anthropic") == (0, 0)
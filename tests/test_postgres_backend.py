@@ -0,0 +1,88 @@
+"""The binary COPY backend (init.py --backend postgres) against the SQL files, on a local Postgres."""
+
+import pytest
+from psycopg.conninfo import make_conninfo
+
+import init
+from templates import load_sql
+
+
+def table_contents(database, schema="public"):
+    """{table: (column types, sorted rows)} of the athletics tables."""
+    import psycopg
+
+    contents = {}
+    with psycopg.connect(make_conninfo("", dbname=database)) as conn:
+        for table in init.TABLES:
+            types = conn.execute(
+                "SELECT column_name, data_type, is_nullable FROM information_schema.columns"
+                " WHERE table_schema = %s AND table_name = %s ORDER BY ordinal_position",
+                (schema, table.lower()),
+            ).fetchall()
+            rows = conn.execute(f"SELECT * FROM {schema}.{table}").fetchall()
+            contents[table] = (types, sorted(rows, key=repr))
+    return contents
+
+
+@pytest.fixture(autouse=True)
+def close_pools():
+    yield
+    init.close_pools()
+
+
+@pytest.mark.parametrize("mode", init.SQL_MODES)
+def test_copy_backend_matches_sql_file(mode, pilot_contexts, scratch_database, tmp_path):
+    # A few contexts, loaded the way one task is
+    context = pilot_contexts[:3]
+    from_file = scratch_database("file")
+    sql_file = init.build_sqlite_db_to_file(context=context, filepath=tmp_path / "task.sql", mode=mode)
+    load_sql("", from_file, sql_file)
+
+    from_copy = scratch_database("copy")
+    init.build_postgres_db(context, dsn=make_conninfo("", dbname=from_copy), batch_size=7)
+
+    expected = table_contents(from_file)
+    assert all(rows for _, rows in expected.values())
+    assert table_contents(from_copy) == expected
+
+
+def test_null_values_survive_copy(pilot_contexts, scratch_database, tmp_path):
+    # No pilot athlete lacks a birth date, so drop it from one and keep only the year of another
+    first, second = pilot_contexts[:2]
+    no_birth = "\n".join(
+        line for line in first.splitlines() if line != "Birth date" and not init.DATE_RE.search(line)
+    )
+    birth_year = init.DATE_RE.sub(lambda m: m.group(1), second, count=1)
+    context = [no_birth, birth_year]
+    assert init.parse_context_to_records(no_birth)[1] == (None, None, None)
+    assert init.parse_context_to_records(birth_year)[1][1:] == (None, None)
+
+    from_file = scratch_database("file")
+    load_sql("", from_file, init.build_sqlite_db_to_file(context=context, filepath=tmp_path / "task.sql"))
+    from_copy = scratch_database("copy")
+    init.build_postgres_db(context, dsn=make_conninfo("", dbname=from_copy))
+
+    expected = table_contents(from_file)
+    births = [row[-3:] for row in expected["PersonalInformation"][1]]
+    assert (None, None, None) in births
+    assert any(b[0] is not None and b[1:] == (None, None) for b in births)
+    assert table_contents(from_copy) == expected
+
+
+def test_schema_is_created_and_search_path_reset(pilot_contexts, scratch_database):
+    database = scratch_database("schema")
+    dsn = make_conninfo("", dbname=database)
+    schema = init.schema_name(0)
+    init.build_postgres_db(pilot_contexts[:2], dsn=dsn, schema=schema)
+    # Loading again replaces the schema instead of adding rows
+    init.build_postgres_db(pilot_contexts[:2], dsn=dsn, schema=schema)
+
+    with init.get_pool(dsn).connection() as conn:
+        (search_path,) = conn.execute("SHOW search_path").fetchone()
+        tables = conn.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'"
+        ).fetchall()
+    assert schema not in search_path
+    assert tables == []
+    contents = table_contents(database, schema=schema)
+    assert len(contents["Athlete"][1]) == 2
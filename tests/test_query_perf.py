@@ -0,0 +1,22 @@
+"""Statement splitting in query_perf.py, which runs multi-statement result.sql files."""
+
+from query_perf import split_statements
+
+
+def test_split_on_semicolons_outside_quotes_and_comments():
+    sql = "SELECT 'a;b', \"c;d\" FROM t; -- e;f\nSELECT 'it''s;' /* g;h */ ; ;"
+    assert split_statements(sql) == ["SELECT 'a;b', \"c;d\" FROM t", "SELECT 'it''s;'"]
+
+
+def test_dollar_quotes_are_not_split():
+    do_block = "DO $$ BEGIN PERFORM 1; END $$"
+    function = (
+        "CREATE FUNCTION f(n int) RETURNS int AS $body$ SELECT n; $body$ LANGUAGE sql"
+    )
+    nested = "SELECT $outer$ ; $$ ; $inner$ $outer$"
+    sql = f"{do_block};\n{function};\n{nested};\nSELECT $1, a$b; SELECT 2"
+    assert split_statements(sql) == [do_block, function, nested, "SELECT $1, a$b", "SELECT 2"]
+
+
+def test_unterminated_dollar_quote_runs_to_the_end():
+    assert split_statements("SELECT 1; SELECT $$ a; b") == ["SELECT 1", "SELECT $$ a; b"]
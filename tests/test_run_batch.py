@@ -0,0 +1,78 @@
+"""run_batch with the stub agent against a local Postgres server, skipped when none is reachable.
+
+Tasks, templates and slot databases get unique names and are dropped afterwards.
+"""
+
+import json
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import run_batch
+from templates import database_name, drop_database
+
+ROWS = 3
+
+
+@pytest.fixture
+def tasks_dir(postgres, pilot_split, unique_name, tmp_path):
+    """ROWS pilot tasks of a split with a unique name, so their templates are too."""
+    split = unique_name("pytest")
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    shutil.copy(pilot_split, data_dir / f"{split}.tsv")
+    out = tmp_path / "tasks"
+    subprocess.run(
+        [
+            sys.executable,
+            str(run_batch.TASKS_DIR / "init.py"),
+            "--rows", str(ROWS),
+            "--data-dir", str(data_dir),
+            "--split", split,
+            "--output-dir", str(out),
+            "--jobs", "1",
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    yield out
+    for i in range(ROWS):
+        drop_database("", database_name(f"{split}_{i}"))
+
+
+@pytest.fixture
+def pool(postgres, unique_name, monkeypatch):
+    monkeypatch.setattr(run_batch, "SLOT_PREFIX", unique_name("pytest_slot") + "_")
+    pool = run_batch.DatabasePool(slots=2)
+    yield pool
+    pool.drop_slots()
+
+
+def test_stub_runs(tasks_dir, pool, tmp_path):
+    tasks = run_batch.discover_tasks(tasks_dir)
+    assert len(tasks) == ROWS
+    output_dir = tmp_path / "output"
+    runner = run_batch.BatchRunner(
+        pool, agent_cmd=run_batch.STUB_AGENT_CMD, tasks_dir=tasks_dir, output_dir=output_dir
+    )
+    records = runner.run(["seed-000", "seed-001"], tasks, workers=2)
+
+    assert len(records) == 2 * ROWS
+    assert {r["status"] for r in records} == {"ok"}
+    assert {r["database"] for r in records} <= set(pool.slots)
+    logged = [json.loads(line) for line in (output_dir / run_batch.RUNS_LOG).read_text().splitlines()]
+    assert len(logged) == 2 * ROWS
+    for task in tasks:
+        task_file = tasks_dir / f"{task}.txt"
+        for seed in ("seed-000", "seed-001"):
+            agent_dir = output_dir / seed / task
+            assert (agent_dir / "TASK.md").exists()
+            assert (agent_dir / "result.txt").read_text().strip()
+            assert (agent_dir / task_file.name).read_text() == task_file.read_text()
+
+    # Resumed runs skip what already has a result
+    runner.resume = True
+    records = runner.run(["seed-000"], tasks, workers=2)
+    assert {r["status"] for r in records} == {"skipped"}
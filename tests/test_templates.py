@@ -0,0 +1,73 @@
+"""Template databases (init.py --backend template) on a local Postgres: build, clone and drop."""
+
+import psycopg
+import pytest
+from psycopg.conninfo import make_conninfo
+
+import init
+from templates import admin_connection, build_template, clone_template, database_exists, drop_database
+
+
+@pytest.fixture
+def template(postgres, unique_name):
+    name = unique_name("pytest_tmpl")
+    yield name
+    drop_database("", name)
+
+
+@pytest.fixture
+def clone(postgres, unique_name):
+    name = unique_name("pytest_clone")
+    yield name
+    drop_database("", name)
+
+
+def table_rows(database):
+    with psycopg.connect(make_conninfo("", dbname=database)) as conn:
+        return {
+            table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall(), key=repr)
+            for table in init.TABLES
+        }
+
+
+def test_clone_has_the_template_rows(pilot_contexts, template, clone):
+    context = pilot_contexts[:3]
+    init.build_template_db(context, template)
+    with admin_connection() as conn:
+        (is_template,) = conn.execute(
+            "SELECT datistemplate FROM pg_database WHERE datname = %s", (template,)
+        ).fetchone()
+    assert is_template
+
+    clone_template("", template, clone)
+    rows = table_rows(clone)
+    assert len(rows["Athlete"]) == len(context)
+    assert len(rows["Medal"]) == sum(len(init.parse_context_to_records(c)[2]) for c in context)
+
+    # Work done in a clone does not reach the template or the next clone
+    with psycopg.connect(make_conninfo("", dbname=clone)) as conn:
+        conn.execute("DELETE FROM Medal")
+    clone_template("", template, clone)
+    assert table_rows(clone) == rows
+
+    drop_database("", clone)
+    drop_database("", template)
+    assert not database_exists("", clone)
+    assert not database_exists("", template)
+
+
+def test_template_is_only_rebuilt_when_the_file_changes(template, clone, tmp_path):
+    # The DO block has semicolons inside its dollar quotes
+    sql_file = tmp_path / "task.sql"
+    sql_file.write_text(
+        "CREATE TABLE t (n int);\n"
+        "DO $$ BEGIN FOR i IN 1..3 LOOP INSERT INTO t VALUES (i); END LOOP; END $$;\n"
+    )
+    assert build_template("", template, sql_file)
+    assert not build_template("", template, sql_file)
+
+    sql_file.write_text("CREATE TABLE t (n int);\nINSERT INTO t VALUES (7);\n")
+    assert build_template("", template, sql_file)
+    clone_template("", template, clone)
+    with psycopg.connect(make_conninfo("", dbname=clone)) as conn:
+        assert conn.execute("SELECT n FROM t").fetchall() == [(7,)]